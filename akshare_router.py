@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+
+import requests
+
+from bar_store import DATA_DIR, write_json_atomic
+
+# akshare 历史行情接口，按默认尝试顺序排列
+AKSHARE_ENDPOINTS = ["fund_etf_hist_em", "stock_zh_a_hist", "stock_zh_index_hist"]
+
+# 获取失败的标的在这段时间内直接跳过（秒）
+NEGATIVE_CACHE_TTL = 30 * 60
+
+# 接口连续出错达到该次数后熔断，冷却期内不再调用（秒）
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN = 5 * 60
+
+ROUTES_PATH = os.path.join(DATA_DIR, "akshare_routes.json")
+
+
+# 单个接口的熔断器
+class CircuitBreaker:
+    """连续出错达到阈值后打开，冷却结束后放行一次试探请求"""
+
+    def __init__(self, threshold=BREAKER_FAILURE_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            # 冷却结束进入半开状态，放行一次请求
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+_breakers = {endpoint: CircuitBreaker() for endpoint in AKSHARE_ENDPOINTS}
+
+_routes = None
+_routes_dirty = False
+_routes_lock = threading.Lock()
+
+
+# 读取持久化的路由表：symbol→接口名，以及失败标的的跳过截止时间
+def _load_routes():
+    global _routes
+    if _routes is None:
+        try:
+            with open(ROUTES_PATH, encoding="utf-8") as f:
+                _routes = json.load(f)
+        except (OSError, ValueError):
+            _routes = {}
+        _routes.setdefault("endpoints", {})
+        _routes.setdefault("failures", {})
+    return _routes
+
+
+def _write_routes():
+    write_json_atomic(ROUTES_PATH, _routes, ensure_ascii=False, indent=2)
+
+
+# 把本次运行中路由表的变化写回文件，一次获取阶段结束时调用一次
+def save_routes():
+    global _routes_dirty
+    with _routes_lock:
+        if _routes_dirty:
+            _write_routes()
+            _routes_dirty = False
+
+
+# 该标的应尝试的接口顺序：已知可用的接口排在最前
+def endpoint_order(symbol):
+    with _routes_lock:
+        known = _load_routes()["endpoints"].get(symbol)
+
+    order = list(AKSHARE_ENDPOINTS)
+    if known in order:
+        order.remove(known)
+        order.insert(0, known)
+
+    return order
+
+
+# 标的已知可用的接口，尚未成功获取过时返回 None
+def resolved_endpoint(symbol):
+    with _routes_lock:
+        return _load_routes()["endpoints"].get(symbol)
+
+
+# 记录标的可用的接口（只修改内存中的路由表，由 save_routes 写回）
+def resolve_endpoint(symbol, endpoint):
+    global _routes_dirty
+    with _routes_lock:
+        routes = _load_routes()
+        changed = routes["endpoints"].get(symbol) != endpoint or symbol in routes["failures"]
+        routes["endpoints"][symbol] = endpoint
+        routes["failures"].pop(symbol, None)
+        _routes_dirty = _routes_dirty or changed
+
+
+# 标的是否处于失败跳过期内
+def is_suppressed(symbol):
+    with _routes_lock:
+        until = _load_routes()["failures"].get(symbol)
+    return until is not None and until > time.time()
+
+
+# 记录标的获取失败，跳过期内不再请求
+def suppress_symbol(symbol, ttl=NEGATIVE_CACHE_TTL):
+    global _routes_dirty
+    with _routes_lock:
+        _load_routes()["failures"][symbol] = time.time() + ttl
+        _routes_dirty = True
+
+
+# 接口是否可以调用（熔断中的接口直接跳过）
+def endpoint_allowed(endpoint):
+    return _breakers[endpoint].allow()
+
+
+# 网络类错误才说明接口不可用；解析类错误通常只是接口与标的类型不匹配
+def is_outage_error(error):
+    return isinstance(error, (requests.exceptions.RequestException, ConnectionError, TimeoutError))
+
+
+# 接口调用结果反馈给熔断器
+def record_endpoint_success(endpoint):
+    _breakers[endpoint].record_success()
+
+
+def record_endpoint_failure(endpoint):
+    _breakers[endpoint].record_failure()
+
+
+def breaker_states():
+    """返回 接口名→是否熔断中"""
+    return {endpoint: breaker.is_open for endpoint, breaker in _breakers.items()}
@@ -0,0 +1,209 @@
+"""操作建议变化提醒：记录每个标的上一次的操作建议和关键价位，建议变化时发出提醒
+
+每次写出快照后评估一次，只处理输入（价格、生命线、止盈线、建议）有变化的标的。
+提醒写入本地日志 data/alerts.jsonl（过大时轮转为 alerts.jsonl.1）；设置环境变量 LEO_ALERT_WEBHOOK 时同时以JSON POST 到该地址，
+发送失败的提醒保留到下次评估时重发。
+"""
+import json
+import logging
+import math
+import os
+import threading
+import urllib.request
+from datetime import datetime, timedelta
+
+from bar_store import DATA_DIR, write_json_atomic
+from metrics import rotate_file, tail_records
+
+logger = logging.getLogger(__name__)
+
+ALERT_STATE_PATH = os.path.join(DATA_DIR, "alert_state.json")
+ALERT_LOG_PATH = os.path.join(DATA_DIR, "alerts.jsonl")
+# 提醒日志超过该大小时改名为 alerts.jsonl.1，重新开始写
+ALERT_LOG_MAX_BYTES = 5 * 1024 * 1024
+WEBHOOK_ENV = "LEO_ALERT_WEBHOOK"
+WEBHOOK_TIMEOUT = 5
+
+# 判断输入是否变化的字段
+INPUT_FIELDS = ('action', 'Close', 'ema61', 'dynamic_exit')
+
+# 已发出提醒的去重记录保留天数，同一K线上重复出现的同一变化只提醒一次
+DEDUP_DAYS = 7
+
+# 等待重发的提醒最多保留的条数
+MAX_PENDING = 500
+
+
+# NaN 转为 None，保存和比较时保持一致
+def _clean(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+# 写入本地日志的提醒输出
+class LogSink:
+    def __init__(self, path=ALERT_LOG_PATH, max_bytes=ALERT_LOG_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    def send(self, events):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.lock:
+            rotate_file(self.path, self.max_bytes)
+            with open(self.path, "a", encoding="utf-8") as f:
+                for event in events:
+                    f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+# 以JSON POST 到 webhook 的提醒输出，一次评估的所有提醒合并为一个请求
+class WebhookSink:
+    def __init__(self, url, timeout=WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, events):
+        body = json.dumps({"events": events}, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+# 按状态转换发出提醒
+class AlertEngine:
+    """状态保存在 state_path：symbol→上一次的输入，已发出提醒的去重记录，以及未送达 webhook 的提醒
+
+    本地日志总是写入；webhook 发送失败时提醒进入待发队列，下次评估时重发。
+    文件被其他进程（后台刷新进程或页面）更新后重新读取。
+    """
+
+    def __init__(self, state_path=ALERT_STATE_PATH, log_sink=None, webhook=None):
+        self.state_path = state_path
+        self.log_sink = log_sink or LogSink()
+        self.webhook = webhook
+        self.state = None
+        self.state_mtime = None
+        self.lock = threading.Lock()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.state_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        mtime = self._mtime()
+        if self.state is not None and mtime == self.state_mtime:
+            return
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {"symbols": {}, "sent": {}, "pending": []}
+        self.state_mtime = mtime
+
+    def _save(self):
+        write_json_atomic(self.state_path, self.state, ensure_ascii=False)
+        self.state_mtime = self._mtime()
+
+    def evaluate(self, rows, bar_dates=None, as_of=None, now=None):
+        """rows 为仪表板各行，bar_dates 为 symbol→最新K线日期；返回本次新发出的提醒
+
+        第一次出现的标的只记录状态，不发提醒。
+        """
+        now = now or datetime.now().astimezone()
+        as_of = as_of or now.isoformat(timespec='seconds')
+        bar_dates = bar_dates or {}
+        with self.lock:
+            self._load()
+            symbols = self.state["symbols"]
+            sent = self.state["sent"]
+            changed = False
+            events = []
+
+            for row in rows:
+                symbol = row['symbol']
+                inputs = {field: _clean(row.get(field)) for field in INPUT_FIELDS}
+                inputs["bar_date"] = bar_dates.get(symbol)
+                previous = symbols.get(symbol)
+                if previous == inputs:
+                    continue
+                symbols[symbol] = inputs
+                changed = True
+                if previous is None or previous["action"] == inputs["action"]:
+                    continue
+
+                event_id = f"{symbol}|{inputs['bar_date']}|{previous['action']}|{inputs['action']}"
+                if event_id in sent:
+                    continue
+                sent[event_id] = now.isoformat(timespec='seconds')
+                events.append({
+                    "id": event_id,
+                    "time": now.isoformat(timespec='seconds'),
+                    "as_of": as_of,
+                    "symbol": symbol,
+                    "name": row.get('name'),
+                    "category": row.get('category'),
+                    "bar_date": inputs["bar_date"],
+                    "previous_action": previous["action"],
+                    "action": inputs["action"],
+                    "Close": inputs["Close"],
+                    "ema61": inputs["ema61"],
+                    "dynamic_exit": inputs["dynamic_exit"],
+                    "previous_ema61": previous["ema61"],
+                    "previous_dynamic_exit": previous["dynamic_exit"],
+                })
+
+            # 过期的去重记录
+            cutoff = (now - timedelta(days=DEDUP_DAYS)).isoformat(timespec='seconds')
+            expired = [event_id for event_id, when in sent.items() if when < cutoff]
+            for event_id in expired:
+                del sent[event_id]
+            changed = changed or bool(expired)
+
+            if events:
+                self.log_sink.send(events)
+                for event in events:
+                    logger.info("提醒: %s(%s) %s → %s", event["name"], event["symbol"], event["previous_action"],
+                                event["action"])
+            if self.webhook is not None and (events or self.state["pending"]):
+                outgoing = self.state["pending"] + events
+                try:
+                    self.webhook.send(outgoing)
+                    self.state["pending"] = []
+                except Exception as e:
+                    logger.warning("提醒发送到 webhook 失败，下次重发: %s", e)
+                    self.state["pending"] = outgoing[-MAX_PENDING:]
+                changed = True
+
+            if changed:
+                self._save()
+        return events
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+# 进程内共享的提醒引擎，webhook 地址取自环境变量
+def default_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            url = os.environ.get(WEBHOOK_ENV)
+            _engine = AlertEngine(webhook=WebhookSink(url) if url else None)
+        return _engine
+
+
+# 评估一个快照
+def evaluate_snapshot(snapshot, engine=None):
+    engine = engine or default_engine()
+    rows = snapshot['dashboard'].to_dict('records')
+    bar_dates = snapshot['bars'].last_dates()
+    return engine.evaluate(rows, bar_dates, snapshot['as_of'])
+
+
+# 读取最近的提醒，只从日志末尾读取需要的行
+def load_alerts(limit=None, path=ALERT_LOG_PATH):
+    return tail_records(path, limit)
@@ -1,432 +1,182 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import yfinance as yf
-import akshare as ak
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
 import time
+from datetime import datetime, timedelta
+from result_cache import ResultCache
+from alerts import load_alerts
+from corporate_actions import add_action, load_actions, symbol_actions
+from dashboard_view import (CHART_RANGES, COLUMN_FORMATS, OVERVIEW_MAX_SYMBOLS, build_chart, build_overview,
+                            cached_chart, filter_dashboard, format_dashboard_table)
+from metrics import RunMetrics, append_metrics, load_metrics
+from pipeline import DIVIDEND_ADJUSTMENTS, load_portfolio
+from snapshot import (load_snapshot, refresh_snapshot, snapshot_bars, snapshot_bars_many, snapshot_is_stale,
+                      snapshot_matches)
 
 # 设置页面
 st.set_page_config(page_title="Leo DashBoard", layout="wide")
 st.title("🔥 Leo TV is DB")
 
-# 标的配置
-PORTFOLIO = [
-    {"category": "美股大盘", "symbol": "^IXIC", "name": "纳斯达克指数", "source": "yfinance"},
-    {"category": "A股大盘", "symbol": "000001", "name": "上证指数", "source": "akshare"},
-    {"category": "美股科技ETF", "symbol": "XLK", "name": "科技ETF", "source": "yfinance"},
-    {"category": "美股医药ETF", "symbol": "XLV", "name": "医疗ETF", "source": "yfinance"},
-    {"category": "A股科技ETF", "symbol": "516630", "name": "云计算50", "source": "akshare"},
-    {"category": "A股科技ETF", "symbol": "588200", "name": "科创芯片", "source": "akshare"},
-    {"category": "A股医药ETF", "symbol": "588860", "name": "科创医药", "source": "akshare"},
-    {"category": "港股医药ETF", "symbol": "159892", "name": "恒生医药", "source": "akshare"},
-    {"category": "港股医药ETF", "symbol": "159316", "name": "恒生创新药", "source": "akshare"},
-    {"category": "港股科技ETF", "symbol": "513180", "name": "恒生科技", "source": "akshare"},
-    {"category": "美股纳指ETF", "symbol": "513300", "name": "纳指ETF", "source": "akshare"},
-    {"category": "黄金ETF", "symbol": "518880", "name": "黄金ETF", "source": "akshare"},
-    {"category": "美股科技个股", "symbol": "NVDA", "name": "英伟达", "source": "yfinance"},
-    {"category": "美股科技个股", "symbol": "TSLA", "name": "特斯拉", "source": "yfinance"},
-    {"category": "港股科技个股", "symbol": "0700.HK", "name": "腾讯控股", "source": "yfinance"},
-    {"category": "A股游戏个股", "symbol": "002425", "name": "ST凯文", "source": "akshare"},
-    {"category": "A股机器人个股", "symbol": "000559", "name": "万向钱潮", "source": "akshare"},
-    {"category": "A股算力个股", "symbol": "600654", "name": "中安科", "source": "akshare"},
-    {"category": "A股医美个股", "symbol": "002004", "name": "华邦健康", "source": "akshare"},
-]
+# 页面在后台刷新进程之后多久仍未看到新快照时自行刷新
+PAGE_REFRESH_GRACE = timedelta(minutes=15)
 
-# 手动调整的除权除息信息
-DIVIDEND_ADJUSTMENTS = {
-    "002004": {
-        "date": "2025-09-16", 
-        "dividend_per_share": 0.2,  # 每股现金分红0.2元
-        "adjustment_type": "cash_dividend",  # 现金分红
-        "confirmed": True
-    },
-}
+# 侧边栏显示的最近提醒条数
+RECENT_ALERTS = 10
 
-# 检测可能的除权除息事件
-def detect_dividend_events(symbol, name, df):
-    """检测可能的除权除息事件"""
-    events = []
-    
-    if df is None or len(df) < 2:
-        return events
-    
-    try:
-        # 检查最近5个交易日内的价格异常变动
-        for i in range(1, min(6, len(df))):
-            # 确保索引有效
-            if -i-1 < -len(df) or -i < -len(df):
-                continue
-                
-            prev_close = df['Close'].iloc[-i-1]
-            current_close = df['Close'].iloc[-i]
-            
-            # 确保是标量值，不是Series
-            if hasattr(prev_close, 'item'):
-                prev_close = prev_close.item()
-            if hasattr(current_close, 'item'):
-                current_close = current_close.item()
-                
-            price_change = (current_close - prev_close) / prev_close
-            
-            # 如果价格变动超过阈值，可能是除权除息
-            if price_change < -0.08:  # 单日跌幅超过8%
-                event_date = df.index[-i].strftime('%Y-%m-%d')
-                adjustment_factor = current_close / prev_close
-                
-                events.append({
-                    "symbol": symbol,
-                    "name": name,
-                    "date": event_date,
-                    "price_change": price_change,
-                    "adjustment_factor": adjustment_factor,
-                    "prev_close": prev_close,
-                    "current_close": current_close
-                })
-    except Exception as e:
-        st.error(f"检测 {name}({symbol}) 除权除息事件时出错: {e}")
-    
-    return events
+# 仪表板表格的最大高度（像素），更多的行在表格内滚动
+TABLE_MAX_HEIGHT = 600
 
-# 获取数据函数 - 使用yfinance
-def get_data_yfinance(symbol, name):
-    try:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=120)
-        
-        # 下载数据
-        data = yf.download(symbol, start=start_date, end=end_date, progress=False)
-        
-        if data.empty:
-            st.warning(f"未获取到 {name}({symbol}) 的数据")
-            return None
-            
-        return data
-        
-    except Exception as e:
-        st.error(f"获取 {name}({symbol}) 数据失败: {e}")
-        return None
+# 进程内共享的结果缓存，跨会话、跨重跑保留
+@st.cache_resource
+def get_result_cache():
+    return ResultCache()
 
-# 获取数据函数 - 使用akshare (带重试机制)
-def get_data_akshare(symbol, name, max_retries=3):
-    for attempt in range(max_retries):
-        try:
-            # 尝试多种方式获取数据
-            df = None
-            
-            # 方法1: 使用基金ETF接口
-            try:
-                df = ak.fund_etf_hist_em(symbol=symbol, period="daily", 
-                                        start_date="20240101", 
-                                        end_date=datetime.now().strftime('%Y%m%d'))
-                if not df.empty:
-                    df.rename(columns={
-                        '日期': 'Date',
-                        '开盘': 'Open',
-                        '收盘': 'Close',
-                        '最高': 'High',
-                        '最低': 'Low',
-                        '成交量': 'Volume'
-                    }, inplace=True)
-            except:
-                pass
-            
-            # 方法2: 使用股票接口
-            if df is None or df.empty:
-                try:
-                    df = ak.stock_zh_a_hist(symbol=symbol, period="daily", 
-                                           start_date="20240101", 
-                                           end_date=datetime.now().strftime('%Y%m%d'))
-                    if not df.empty:
-                        df.rename(columns={
-                            '日期': 'Date',
-                            '开盘': 'Open',
-                            '收盘': 'Close',
-                            '最高': 'High',
-                            '最低': 'Low',
-                            '成交量': 'Volume'
-                        }, inplace=True)
-                except:
-                    pass
-            
-            # 方法3: 使用指数接口
-            if df is None or df.empty:
-                try:
-                    df = ak.stock_zh_index_hist(symbol=symbol, period="daily", 
-                                               start_date="20240101", 
-                                               end_date=datetime.now().strftime('%Y%m%d'))
-                    if not df.empty:
-                        df.rename(columns={
-                            '日期': 'Date',
-                            '开盘': 'Open',
-                            '收盘': 'Close',
-                            '最高': 'High',
-                            '最低': 'Low',
-                            '成交量': 'Volume'
-                        }, inplace=True)
-                except:
-                    pass
-            
-            if df is None or df.empty:
-                if attempt == max_retries - 1:
-                    st.warning(f"未获取到 {name}({symbol}) 的数据")
-                continue
-            
-            df['Date'] = pd.to_datetime(df['Date'])
-            df.set_index('Date', inplace=True)
-            
-            return df
-            
-        except Exception as e:
-            if attempt == max_retries - 1:
-                st.error(f"获取 {name}({symbol}) 数据失败: {e}")
-            time.sleep(1)  # 等待1秒后重试
-    
-    return None
+# 在页面上显示计算过程中记录的消息
+def show_messages(entries):
+    for entry in entries:
+        if entry["level"] == "error":
+            st.error(entry["message"])
+            if entry["detail"]:
+                st.error(entry["detail"])
+        else:
+            st.warning(entry["message"])
 
-# 处理除权除息调整
-def adjust_for_dividends(df, symbol):
-    if symbol in DIVIDEND_ADJUSTMENTS and DIVIDEND_ADJUSTMENTS[symbol].get("confirmed", False):
-        adjustment = DIVIDEND_ADJUSTMENTS[symbol]
-        adjustment_date = pd.to_datetime(adjustment["date"])
-        
-        # 找到调整日期之前的所有数据
-        pre_adjustment = df[df.index < adjustment_date]
-        
-        if not pre_adjustment.empty:
-            # 现金分红调整
-            if adjustment.get("adjustment_type") == "cash_dividend" and "dividend_per_share" in adjustment:
-                dividend_per_share = adjustment["dividend_per_share"]
-                
-                # 对于现金分红，我们需要将分红前的价格减去分红金额
-                for col in ['Open', 'High', 'Low', 'Close']:
-                    df.loc[df.index < adjustment_date, col] = df.loc[df.index < adjustment_date, col] - dividend_per_share
-            
-            # 比例调整（股票分割等）
-            elif adjustment.get("adjustment_type") == "factor" and "adjustment_factor" in adjustment:
-                adjustment_factor = adjustment["adjustment_factor"]
-                
-                # 对于比例调整，我们需要将分红前的价格乘以调整因子
-                for col in ['Open', 'High', 'Low', 'Close']:
-                    df.loc[df.index < adjustment_date, col] = df.loc[df.index < adjustment_date, col] * adjustment_factor
-                
-                # 调整成交量
-                df.loc[df.index < adjustment_date, 'Volume'] = df.loc[df.index < adjustment_date, 'Volume'] / adjustment_factor
+# 显示耗时统计：本页渲染、最近一次数据刷新的各阶段和各数据源接口，以及历次刷新的总耗时
+def show_metrics(snapshot, page_metrics):
+    st.write("本页各阶段耗时(秒):", page_metrics.summary()["stages"])
+    st.write(f"K线存储: {len(snapshot['bars'])} 个标的，{snapshot['bars'].nbytes / 1e6:.1f} MB（进程内共享）")
     
-    return df
-
-# 计算技术指标
-def calculate_technicals_simple(df, symbol):
-    if df is None or df.empty or len(df) < 65:
-        return None
+    metrics = snapshot.get('metrics')
+    if not metrics:
+        return
+    st.write(f"数据刷新各阶段耗时(秒)，快照 {snapshot['version']}:", metrics["stages"])
+    if metrics["calls"]:
+        calls = pd.DataFrame(metrics["calls"]).T.sort_values('seconds', ascending=False)
+        st.write("数据源接口:", calls)
+    if metrics["counters"]:
+        st.write("重试/回退计数:", metrics["counters"])
+    if metrics["symbols"]:
+        slowest = sorted(metrics["symbols"].items(), key=lambda entry: entry[1], reverse=True)[:5]
+        st.write("获取最慢的标的(秒):", dict(slowest))
     
-    try:
-        # 处理除权除息调整
-        df = adjust_for_dividends(df, symbol)
-        
-        # 创建结果字典
-        result = {}
-        
-        # 确保我们获取的是标量值而不是Series
-        close_price = df['Close'].iloc[-1]
-        if hasattr(close_price, 'item'):
-            close_price = close_price.item()
-        result['Close'] = float(close_price)
-        
-        # 计算EMA61
-        ema61_series = df['Close'].ewm(span=61, adjust=False).mean()
-        ema61 = ema61_series.iloc[-1]
-        if hasattr(ema61, 'item'):
-            ema61 = ema61.item()
-        result['ema61'] = float(ema61)
-        
-        # 判断趋势状态 - 使用标量值比较
-        result['trend_status'] = '🟢 多头' if result['Close'] > result['ema61'] else '🔴 空头'
-        
-        # 计算ATR (简化版)
-        high = df['High']
-        low = df['Low']
-        close = df['Close']
-        
-        # 计算真实波幅
-        tr1 = high - low
-        tr2 = abs(high - close.shift())
-        tr3 = abs(low - close.shift())
-        
-        tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-        atr = tr.rolling(14).mean().iloc[-1]
-        if hasattr(atr, 'item'):
-            atr = atr.item()
-        result['atr14'] = float(atr)
-        
-        # 计算N日高点
-        n_period = 20
-        n_high = df['High'].rolling(window=n_period).max().iloc[-1]
-        if hasattr(n_high, 'item'):
-            n_high = n_high.item()
-        result['n_high'] = float(n_high)
-        
-        # 计算动态止盈价
-        result['dynamic_exit'] = result['n_high'] - 3 * result['atr14']
-        
-        # 计算距离止盈跌幅
-        result['exit_distance_pct'] = (result['Close'] - result['dynamic_exit']) / result['Close']
-        
-        # 存储调整后的数据用于后续分析
-        result['adjusted_data'] = df
-        
-        return result
-        
-    except Exception as e:
-        st.error(f"计算技术指标时出错: {e}")
-        import traceback
-        st.error(traceback.format_exc())
-        return None
+    history = load_metrics(limit=50, kind="pipeline")
+    if len(history) > 1:
+        totals = pd.DataFrame({
+            "time": [record["time"] for record in history],
+            "total": [record["stages"].get("total") for record in history],
+            "fetch": [record["stages"].get("fetch") for record in history],
+        }).set_index("time")
+        st.write("最近刷新耗时(秒):")
+        st.line_chart(totals)
 
-# 生成操作建议
-def generate_action(result, category):
-    if result is None:
-        return '⏳ 数据不足'
-    
-    if '违规' in category:
-        return '🚨 违反宪法'
+# 在页面中计算并写出快照（没有快照、快照过期或手动刷新时）
+def refresh_in_page(cache, portfolio, intraday=False):
+    progress_bar = st.progress(0)
+    status_text = st.empty()
     
-    if result.get('trend_status', '') == '🔴 空头':
-        return '🔴 破位清仓'
+    # 进度更新只在主线程中进行
+    def show_progress(completed, total, message):
+        status_text.text(f"{message} ({completed}/{total})")
+        progress_bar.progress(completed/total)
     
-    exit_pct = result.get('exit_distance_pct', 0)
-    if exit_pct < 0:
-        return '🎯 触发止盈'
+    snapshot = refresh_snapshot(portfolio, cache, show_progress, intraday=intraday)
     
-    return '🟢 持有'
+    # 清除进度条
+    progress_bar.empty()
+    status_text.empty()
+    return snapshot
 
 # 主程序
-def main():
-    all_data = []
-    dividend_events = []
+def main(page_metrics):
+    # 载入公司行动表（首次运行时写入手动配置的除权除息信息）
+    load_actions(seed=DIVIDEND_ADJUSTMENTS)
+    try:
+        portfolio = load_portfolio()
+    except (OSError, ValueError) as e:
+        st.error(f"读取标的文件失败: {e}")
+        return
     
-    # 显示进度条
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    # 优先读取后台刷新进程写出的快照，页面打开时不再等待下载
+    cache = get_result_cache()
+    with page_metrics.stage("load_snapshot"):
+        snapshot = load_snapshot()
+    refresh = st.sidebar.button("🔄 刷新数据")
+    refresh_live = st.sidebar.button("⚡ 更新盘中价格", help="历史K线使用缓存，只用全市场实时行情批量更新当天的K线")
+    with page_metrics.stage("refresh"):
+        if refresh:
+            cache.clear()
+            snapshot = refresh_in_page(cache, portfolio)
+        elif refresh_live:
+            snapshot = refresh_in_page(cache, portfolio, intraday=True)
+        elif (snapshot is None or snapshot_is_stale(snapshot, PAGE_REFRESH_GRACE)
+              or not snapshot_matches(snapshot, portfolio)):
+            snapshot = refresh_in_page(cache, portfolio)
+    show_messages(snapshot['messages'])
     
-    # 首先收集所有可能的除权除息事件
-    for i, item in enumerate(PORTFOLIO):
-        status_text.text(f"正在分析 {item['name']} 的除权除息事件 ({i+1}/{len(PORTFOLIO)})")
-        progress_bar.progress((i+1)/len(PORTFOLIO))
-        
-        try:
-            # 获取数据
-            if item['source'] == 'yfinance':
-                df = get_data_yfinance(item['symbol'], item['name'])
-            else:
-                df = get_data_akshare(item['symbol'], item['name'])
-            
-            # 检测除权除息事件
-            if df is not None and not df.empty:
-                events = detect_dividend_events(item['symbol'], item['name'], df)
-                dividend_events.extend(events)
-        
-        except Exception as e:
-            st.error(f"分析 {item['name']} 时出错: {e}")
-        
-        # 添加短暂延迟
-        time.sleep(0.1)
+    # 显示数据时间和各市场数据的下次更新时间
+    as_of = datetime.fromisoformat(snapshot['as_of'])
+    live_symbols = snapshot.get('live_symbols', [])
+    st.sidebar.caption(f"数据时间: {as_of.strftime('%Y-%m-%d %H:%M')}"
+                       + (f"（{len(live_symbols)} 个标的为盘中价格）" if live_symbols else ""))
+    st.sidebar.caption("下次更新: " + "，".join(
+        f"{market} {datetime.fromisoformat(when).strftime('%m-%d %H:%M')}"
+        for market, when in sorted(snapshot['next_updates'].items())))
+    
+    # 显示获取失败的标的
+    fetch_status = snapshot['fetch_status']
+    failed = [item for item in portfolio if not fetch_status.get(item['symbol'], {"ok": False})['ok']]
+    if failed:
+        with st.sidebar.expander(f"⚠️ 数据获取失败 ({len(failed)}/{len(portfolio)})"):
+            st.dataframe(pd.DataFrame([{"symbol": item['symbol'], "name": item['name'],
+                                        "error": fetch_status.get(item['symbol'], {}).get('error')}
+                                       for item in failed]), hide_index=True)
+    
+    # 显示最近的操作建议变化提醒
+    recent_alerts = load_alerts(limit=RECENT_ALERTS)
+    if recent_alerts:
+        with st.sidebar.expander(f"🔔 最近提醒 ({len(recent_alerts)})"):
+            for event in reversed(recent_alerts):
+                st.write(f"{event['time'][5:16].replace('T', ' ')} **{event['name']}({event['symbol']})** "
+                         f"{event['previous_action']} → {event['action']}")
     
     # 显示检测到的除权除息事件供用户确认
+    dividend_events = snapshot['dividend_events']
     if dividend_events:
         st.sidebar.subheader("📋 检测到的除权除息事件")
         for event in dividend_events:
-            if event["symbol"] not in DIVIDEND_ADJUSTMENTS or not DIVIDEND_ADJUSTMENTS[event["symbol"]].get("confirmed", False):
+            confirmed_dates = {action["date"] for action in symbol_actions(event["symbol"])}
+            if event["date"] not in confirmed_dates:
                 st.sidebar.write(f"**{event['name']}({event['symbol']})**")
-                st.sidebar.write(f"日期: {event['date']}, 价格变动: {event['price_change']*100:.2f}%")
+                st.sidebar.write(f"日期: {event['date']}, 价格变动: {event['price_change']*100:.2f}%, "
+                                 f"同类变动: {event['reference_change']*100:.2f}%, ATR倍数: {event['atr_multiple']:.1f}")
                 
                 if st.sidebar.button(f"确认 {event['name']} 的除权除息", key=f"confirm_{event['symbol']}_{event['date']}"):
-                    DIVIDEND_ADJUSTMENTS[event["symbol"]] = {
-                        "date": event["date"],
-                        "adjustment_factor": event["adjustment_factor"],
-                        "adjustment_type": "factor",
-                        "confirmed": True
-                    }
-                    st.sidebar.success(f"已确认 {event['name']} 的除权除息事件")
+                    add_action(event["symbol"], event["date"], "factor",
+                               adjustment_factor=event["adjustment_factor"])
+                    # 公司行动表变化使快照失效，重跑后按新的复权重新计算
+                    st.rerun()
     
-    # 清除进度条
-    progress_bar.empty()
-    status_text.empty()
+    df_dashboard = snapshot['dashboard']
     
-    # 重新显示进度条进行数据处理
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    for i, item in enumerate(PORTFOLIO):
-        status_text.text(f"正在处理 {item['name']} ({i+1}/{len(PORTFOLIO)})")
-        progress_bar.progress((i+1)/len(PORTFOLIO))
-        
-        try:
-            # 获取数据
-            if item['source'] == 'yfinance':
-                df = get_data_yfinance(item['symbol'], item['name'])
-            else:
-                df = get_data_akshare(item['symbol'], item['name'])
-            
-            # 计算技术指标
-            if df is not None and not df.empty:
-                result = calculate_technicals_simple(df, item['symbol'])
-                if result is not None:
-                    result['symbol'] = item['symbol']
-                    result['name'] = item['name']
-                    result['category'] = item['category']
-                    result['action'] = generate_action(result, item['category'])
-                    all_data.append(result)
-            
-        except Exception as e:
-            st.error(f"处理 {item['name']} 时出错: {e}")
-            import traceback
-            st.error(traceback.format_exc())
-        
-        # 添加短暂延迟
-        time.sleep(0.5)
-    
-    # 清除进度条
-    progress_bar.empty()
-    status_text.empty()
-    
-    if all_data:
-        df_dashboard = pd.DataFrame(all_data)
+    if not df_dashboard.empty:
+        table_start = time.perf_counter()
         
         # 显示监控仪表板
         st.subheader("持仓监控仪表板")
         
-        # 创建列名映射字典
-        column_name_mapping = {
-            'ema61': '生命线',
-        }
-        
-        # 选择要显示的列
-        display_columns = ['symbol', 'name', 'category', 'Close', 'ema61', 
-                          'trend_status', 'dynamic_exit', 'exit_distance_pct', 'action']
-        
-        # 确保所有列都存在
-        available_columns = [col for col in display_columns if col in df_dashboard.columns]
-        
-        # 格式化显示
-        display_df = df_dashboard[available_columns].copy()
-        
-        # 重命名列
-        display_df = display_df.rename(columns=column_name_mapping)
-        
-        # 格式化数字
-        numeric_cols = ['Close', '生命线', 'dynamic_exit']
-        for col in numeric_cols:
-            if col in display_df.columns:
-                display_df[col] = display_df[col].apply(lambda x: f"{x:.4f}" if not pd.isna(x) else "N/A")
-        
-        if 'exit_distance_pct' in display_df.columns:
-            display_df['exit_distance_pct'] = display_df['exit_distance_pct'].apply(
-                lambda x: f"{(x * 100):.2f}%" if not pd.isna(x) else "N/A")
-        
-        # 使用Streamlit的表格功能，而不是数据框，以获得更好的格式控制
-        st.table(display_df)
+        # 按类别和操作建议筛选
+        filter_cols = st.columns(2)
+        categories = filter_cols[0].multiselect("类别", sorted(df_dashboard['category'].dropna().unique()))
+        actions = filter_cols[1].multiselect("操作建议", sorted(df_dashboard['action'].dropna().unique()))
+        df_filtered = filter_dashboard(df_dashboard, categories, actions)
+        
+        # 数字列保持数值类型，表格按列格式显示；表格组件只渲染可见的行，支持点击列名排序
+        display_df = format_dashboard_table(df_filtered)
+        column_config = {col: st.column_config.NumberColumn(format=fmt)
+                         for col, fmt in COLUMN_FORMATS.items() if col in display_df.columns}
+        st.dataframe(display_df, column_config=column_config, hide_index=True,
+                     height=min(TABLE_MAX_HEIGHT, 35 * (len(display_df) + 1) + 3))
+        st.caption(f"显示 {len(df_filtered)}/{len(df_dashboard)} 个标的")
+        page_metrics.add_stage("table", time.perf_counter() - table_start)
         
         # 添加手动调整说明
         st.info("""
@@ -437,64 +187,29 @@ def main():
         - 现金分红和股票分割使用不同的调整方式
         """)
         
-        # 选择标的显示详细图表
+        # 选择标的显示详细图表（只列出筛选后的标的）
         st.subheader("个股技术分析")
+        all_data = (df_filtered if not df_filtered.empty else df_dashboard).to_dict('records')
         options = [f"{item['symbol']} - {item['name']}" for item in all_data]
         selected_symbol = st.selectbox("选择标的", options)
+        chart_range = st.radio("时间范围", list(CHART_RANGES), index=1, horizontal=True)
         symbol = selected_symbol.split(' - ')[0]
         selected_item = next((item for item in all_data if item['symbol'] == symbol), None)
         
         if selected_item:
-            # 使用已经计算好的调整后数据
-            df_selected = selected_item.get('adjusted_data')
+            # 使用快照中调整后的数据
+            df_selected = snapshot_bars(snapshot, symbol)
             
             if df_selected is not None and not df_selected.empty:
                 try:
-                    # 创建图表
-                    fig = go.Figure()
-                    
-                    # 添加K线
-                    fig.add_trace(go.Candlestick(
-                        x=df_selected.index,
-                        open=df_selected['Open'],
-                        high=df_selected['High'],
-                        low=df_selected['Low'],
-                        close=df_selected['Close'],
-                        name='K线'
-                    ))
-                    
-                    # 计算并添加EMA61线
-                    ema61 = df_selected['Close'].ewm(span=61, adjust=False).mean()
-                    fig.add_trace(go.Scatter(
-                        x=df_selected.index,
-                        y=ema61,
-                        name='61日EMA',
-                        line=dict(color='orange', width=2)
-                    ))
-                    
-                    # 优化Y轴范围 - 修复错误
-                    try:
-                        low_min = float(df_selected['Low'].min())
-                        high_max = float(df_selected['High'].max())
-                        ema61_min = float(ema61.min())
-                        ema61_max = float(ema61.max())
-                        
-                        y_min = min(low_min, ema61_min) * 0.98
-                        y_max = max(high_max, ema61_max) * 1.02
-                    except:
-                        # 如果计算Y轴范围出错，使用默认范围
-                        y_min = float(df_selected['Low'].min()) * 0.98
-                        y_max = float(df_selected['High'].max()) * 1.02
-                    
-                    fig.update_layout(
-                        title=f"{selected_item['name']} 技术分析",
-                        xaxis_title='日期',
-                        yaxis_title='价格',
-                        xaxis_rangeslider_visible=False,
-                        yaxis=dict(range=[y_min, y_max])
-                    )
+                    # 图表按快照版本缓存，同一快照内重跑或其他会话直接复用
+                    chart_start = time.perf_counter()
+                    fig = cached_chart((snapshot['version'], symbol, chart_range),
+                                       lambda: build_chart(df_selected, selected_item['name'],
+                                                           CHART_RANGES[chart_range]))
                     
                     st.plotly_chart(fig, use_container_width=True)
+                    page_metrics.add_stage("chart", time.perf_counter() - chart_start)
                     
                     # 显示最新数据 - 直接从已计算的结果中获取
                     cols = st.columns(4)
@@ -521,14 +236,33 @@ def main():
                                 st.write(f"最新5个收盘价: {list(close_data.tail(5))}")
                         
                         st.write(f"生命线计算值: {selected_item['ema61']:.4f}")
-                        if symbol in DIVIDEND_ADJUSTMENTS:
-                            st.write(f"已应用除权除息调整: {DIVIDEND_ADJUSTMENTS[symbol]}")
+                        applied_actions = symbol_actions(symbol)
+                        if applied_actions:
+                            st.write(f"已应用除权除息调整: {applied_actions}")
+                        
+                        show_metrics(snapshot, page_metrics)
                 except Exception as e:
                     st.error(f"绘制图表时出错: {e}")
                     import traceback
                     st.error(traceback.format_exc())
+        
+        # 筛选后各标的的小图总览，打开时才生成
+        if st.toggle("显示全部标的小图"):
+            overview_symbols = [item['symbol'] for item in all_data[:OVERVIEW_MAX_SYMBOLS]]
+            if len(all_data) > OVERVIEW_MAX_SYMBOLS:
+                st.caption(f"只显示前 {OVERVIEW_MAX_SYMBOLS}/{len(all_data)} 个标的，可用上方的筛选缩小范围")
+            names = {item['symbol']: item['name'] for item in all_data}
+            overview_start = time.perf_counter()
+            fig = cached_chart((snapshot['version'], "overview", tuple(overview_symbols), chart_range),
+                               lambda: build_overview(snapshot_bars_many(snapshot, overview_symbols), names,
+                                                      CHART_RANGES[chart_range]))
+            st.plotly_chart(fig, use_container_width=True)
+            page_metrics.add_stage("overview", time.perf_counter() - overview_start)
     else:
         st.warning("未能获取任何数据，请检查网络连接和代码配置")
 
 if __name__ == "__main__":
-    main()
+    page_metrics = RunMetrics()
+    with page_metrics.stage("total"):
+        main(page_metrics)
+    append_metrics("page", page_metrics.summary())
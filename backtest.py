@@ -0,0 +1,268 @@
+"""回测与参数扫描：按仪表板的操作建议规则，在各标的完整的复权历史上回测
+
+规则与 generate_action 一致：收盘价在生命线（EMA）之上且不低于动态止盈线
+（N日高点 - 倍数 × ATR）时持有，否则空仓；信号在收盘时产生，按收盘价成交。
+
+    python backtest.py                                   # 当前参数的回测
+    python backtest.py --spans 21,41,61,89 --atr-windows 10,14,20 \\
+        --n-periods 10,20,40 --multipliers 2,2.5,3,3.5 --workers 8 --output sweep.csv
+"""
+import argparse
+import itertools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from bar_store import load_bars
+from corporate_actions import apply_actions, load_actions
+from indicators import ATR_WINDOW, EMA_SPAN, EXIT_ATR_MULTIPLIER, MIN_BARS, N_PERIOD, build_panel
+from pipeline import DIVIDEND_ADJUSTMENTS, load_portfolio
+
+# 年化使用的每年交易日数
+TRADING_DAYS = 252
+
+PARAM_NAMES = ['ema_span', 'atr_window', 'n_period', 'exit_multiplier']
+
+STAT_COLUMNS = ['total_return', 'annual_return', 'volatility', 'sharpe', 'max_drawdown',
+                'trades', 'exposure', 'buy_hold_return']
+
+# 工作进程中的面板和指标缓存（由 _init_worker 设置）
+_worker_panel = None
+_worker_indicators = {}
+
+
+# 读取组合内各标的的完整历史并复权
+def load_history(portfolio=None):
+    portfolio = portfolio or load_portfolio()
+    load_actions(seed=DIVIDEND_ADJUSTMENTS)
+    frames = {}
+    for item in portfolio:
+        # 违规类别的操作建议固定为清仓，不参与回测
+        if '违规' in item['category']:
+            continue
+        df = load_bars(item['source'], item['symbol'])
+        if df is not None and len(df) >= MIN_BARS:
+            frames[item['symbol']] = apply_actions(df, item['symbol'])
+    return frames
+
+
+# 回测用的面板：各标的K线右对齐，并记录每行对应的日期，用于按日期汇总组合收益
+def build_backtest_panel(frames):
+    panel = build_panel(frames)
+    rows = panel['Close'].shape[0]
+
+    dates = pd.DatetimeIndex(sorted(set().union(*(frames[symbol].index for symbol in panel['symbols']))))
+    date_pos = np.full((rows, len(panel['symbols'])), -1, dtype=np.int64)
+    for j, symbol in enumerate(panel['symbols']):
+        index = frames[symbol].index
+        date_pos[rows - len(index):, j] = dates.get_indexer(index)
+    panel['dates'] = dates
+    panel['date_pos'] = date_pos
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = np.full_like(panel['Close'], np.nan)
+        returns[1:] = panel['Close'][1:] / panel['Close'][:-1] - 1
+    panel['returns'] = returns
+
+    # 等权持有所有标的（买入持有）的收益，作为比较基准
+    buy_hold = portfolio_returns(panel, np.where(panel['active'], returns, np.nan))
+    panel['buy_hold_return'] = float(np.expm1(np.nansum(np.log1p(buy_hold))))
+    return panel
+
+
+# 各指标只依赖自己的参数，扫描时按参数缓存，组合参数时直接复用
+def _indicator(panel, cache, name, param):
+    key = (name, param)
+    if key not in cache:
+        if name == 'ema':
+            value = pd.DataFrame(panel['Close']).ewm(span=param, adjust=False).mean().to_numpy()
+        elif name == 'atr':
+            if 'tr' not in cache:
+                high, low, close = panel['High'], panel['Low'], panel['Close']
+                prev_close = np.full_like(close, np.nan)
+                prev_close[1:] = close[:-1]
+                cache['tr'] = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+            value = pd.DataFrame(cache['tr']).rolling(window=param).mean().to_numpy()
+        else:
+            value = pd.DataFrame(panel['High']).rolling(window=param).max().to_numpy()
+        cache[key] = value
+    return cache[key]
+
+
+# 按规则得到每根K线收盘后的持仓（1 持有，0 空仓）
+def positions(panel, cache, ema_span, atr_window, n_period, exit_multiplier):
+    close = panel['Close']
+    ema = _indicator(panel, cache, 'ema', ema_span)
+    atr = _indicator(panel, cache, 'atr', atr_window)
+    n_high = _indicator(panel, cache, 'n_high', n_period)
+
+    dynamic_exit = n_high - exit_multiplier * atr
+    # 指标未就绪（K线不足）时不持仓，对应仪表板上的“数据不足”
+    with np.errstate(invalid='ignore'):
+        hold = (close > ema) & (close >= dynamic_exit) & ~np.isnan(dynamic_exit)
+    return hold.astype('float64')
+
+
+# 策略每根K线的收益：持有上一根K线收盘时的仓位，仓位变化时扣除交易成本
+def strategy_returns(panel, hold, cost=0.0):
+    previous = np.zeros_like(hold)
+    previous[1:] = hold[:-1]
+    returns = np.where(panel['active'], previous * np.nan_to_num(panel['returns']), np.nan)
+    returns -= cost * np.abs(hold - previous)
+    return np.where(panel['active'], returns, np.nan), previous
+
+
+# 收益矩阵（K线 × 列）的统计指标，每列独立计算
+def return_stats(returns):
+    observed = ~np.isnan(returns)
+    count = observed.sum(axis=0)
+    log_growth = np.nancumsum(np.log1p(returns), axis=0)
+    total = np.expm1(log_growth[-1]) if len(returns) else np.zeros(returns.shape[1])
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        annual = np.power(1 + total, TRADING_DAYS / count) - 1
+        mean = np.nanmean(returns, axis=0)
+        std = np.nanstd(returns, axis=0, ddof=1)
+        sharpe = mean / std * np.sqrt(TRADING_DAYS)
+
+    equity = np.exp(log_growth)
+    drawdown = equity / np.maximum.accumulate(equity, axis=0) - 1
+    return {
+        'total_return': total,
+        'annual_return': annual,
+        'volatility': std * np.sqrt(TRADING_DAYS),
+        'sharpe': np.where(std > 0, sharpe, np.nan),
+        'max_drawdown': drawdown.min(axis=0) if len(returns) else np.zeros(returns.shape[1]),
+    }
+
+
+# 等权组合：每天持有当天有K线的所有标的，按日期汇总各标的的策略收益
+def portfolio_returns(panel, returns):
+    wide = np.full((len(panel['dates']), returns.shape[1]), np.nan)
+    rows, columns = np.nonzero(panel['date_pos'] >= 0)
+    wide[panel['date_pos'][rows, columns], columns] = returns[rows, columns]
+    count = (~np.isnan(wide)).sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nansum(wide, axis=1, keepdims=True) / count
+
+
+# 单组参数的回测
+def _run(panel, cache, params, cost, detail=False):
+    hold = positions(panel, cache, **params)
+    returns, previous = strategy_returns(panel, hold, cost)
+    active = panel['active']
+
+    combined = portfolio_returns(panel, returns)
+    stats = {name: float(value[0]) for name, value in return_stats(combined).items()}
+    entries = (hold > previous) & active
+    stats['trades'] = int(entries.sum())
+    stats['exposure'] = float(previous[active].mean()) if active.any() else np.nan
+    stats['buy_hold_return'] = panel['buy_hold_return']
+    if not detail:
+        return stats
+
+    per_symbol = pd.DataFrame(return_stats(returns), index=panel['symbols'])
+    per_symbol['trades'] = entries.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        per_symbol['exposure'] = (previous * active).sum(axis=0) / active.sum(axis=0)
+    per_symbol['buy_hold_return'] = np.expm1(np.nansum(np.log1p(panel['returns']), axis=0))
+    equity = pd.Series(np.exp(np.nancumsum(np.log1p(combined[:, 0]))), index=panel['dates'], name='equity')
+    return {"portfolio": stats, "symbols": per_symbol[STAT_COLUMNS], "equity": equity}
+
+
+# 回测一组参数，返回组合统计、各标的统计和组合净值
+def backtest(frames, ema_span=EMA_SPAN, atr_window=ATR_WINDOW, n_period=N_PERIOD,
+             exit_multiplier=EXIT_ATR_MULTIPLIER, cost=0.0):
+    panel = build_backtest_panel(frames)
+    params = {'ema_span': ema_span, 'atr_window': atr_window, 'n_period': n_period,
+              'exit_multiplier': exit_multiplier}
+    return _run(panel, {}, params, cost, detail=True)
+
+
+def _init_worker(panel):
+    global _worker_panel
+    _worker_panel = panel
+    _worker_indicators.clear()
+
+
+def _run_chunk(chunk, cost):
+    return [dict(params, **_run(_worker_panel, _worker_indicators, params, cost)) for params in chunk]
+
+
+# 参数扫描
+def sweep(frames, grid, cost=0.0, max_workers=None):
+    """grid 为 参数名→候选值列表，返回每组参数一行的组合统计，按夏普比率降序
+
+    参数组合按 (EMA, ATR, N日) 排序后切块分给进程池，同一块内的指标只计算一次；
+    面板在每个工作进程启动时传入一次。
+    """
+    panel = build_backtest_panel(frames)
+    combos = [dict(zip(PARAM_NAMES, values))
+              for values in itertools.product(*(sorted(grid[name]) for name in PARAM_NAMES))]
+    max_workers = max_workers or os.cpu_count() or 1
+
+    if max_workers <= 1 or len(combos) < 2 * max_workers:
+        cache = {}
+        rows = [dict(params, **_run(panel, cache, params, cost)) for params in combos]
+    else:
+        chunk_size = -(-len(combos) // (4 * max_workers))
+        chunks = [combos[i:i + chunk_size] for i in range(0, len(combos), chunk_size)]
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(panel,)) as executor:
+            rows = [row for result in executor.map(_run_chunk, chunks, itertools.repeat(cost))
+                    for row in result]
+
+    table = pd.DataFrame(rows, columns=PARAM_NAMES + STAT_COLUMNS)
+    return table.sort_values('sharpe', ascending=False, na_position='last').reset_index(drop=True)
+
+
+def _values(text, cast):
+    return [cast(value) for value in text.split(',') if value.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="回测仪表板的操作建议规则并扫描参数")
+    parser.add_argument('--spans', default=str(EMA_SPAN), help="EMA周期，逗号分隔")
+    parser.add_argument('--atr-windows', default=str(ATR_WINDOW), help="ATR窗口，逗号分隔")
+    parser.add_argument('--n-periods', default=str(N_PERIOD), help="N日高点窗口，逗号分隔")
+    parser.add_argument('--multipliers', default=str(EXIT_ATR_MULTIPLIER), help="止盈ATR倍数，逗号分隔")
+    parser.add_argument('--cost', type=float, default=0.0, help="每次买入或卖出的成本（比例，如 0.001）")
+    parser.add_argument('--workers', type=int, default=None, help="进程数，默认为CPU核数")
+    parser.add_argument('--output', help="扫描结果CSV路径")
+    parser.add_argument('--watchlist', help="标的文件（CSV/YAML），默认使用 LEO_WATCHLIST 或内置组合")
+    parser.add_argument('--top', type=int, default=10, help="显示的最优参数组数")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    frames = load_history(load_portfolio(args.watchlist))
+    if not frames:
+        logging.error("本地没有足够的K线数据，请先运行 batch.py 或 refresher.py --once")
+        return 1
+
+    grid = {
+        'ema_span': _values(args.spans, int),
+        'atr_window': _values(args.atr_windows, int),
+        'n_period': _values(args.n_periods, int),
+        'exit_multiplier': _values(args.multipliers, float),
+    }
+    table = sweep(frames, grid, args.cost, args.workers)
+    logging.info("%d 个标的，%d 组参数", len(frames), len(table))
+
+    if args.output:
+        table.to_csv(args.output, index=False)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(table.head(args.top).to_string(index=False))
+
+        best = table.iloc[0]
+        result = backtest(frames, int(best['ema_span']), int(best['atr_window']), int(best['n_period']),
+                          float(best['exit_multiplier']), args.cost)
+        print()
+        print(result['symbols'].to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from indicators import EMA_SPAN, build_panel
+
+# 各字段的存储类型：价格和生命线用 float32（只用于显示和图表，指标按 float64 计算），成交量用 int64
+BLOCK_FIELDS = {'Open': np.float32, 'High': np.float32, 'Low': np.float32, 'Close': np.float32,
+                'Volume': np.int64, 'ema61': np.float32}
+
+
+# 只读的K线存储：每个字段一个连续数组，各标的的K线首尾相接
+class BarBlock:
+    """第 i 个标的的K线位于 offsets[i]:offsets[i+1]，日期为 datetime64[ns] 的 int64 表示
+
+    数组不可写，同一进程内的所有会话和结果共享同一份，按标的取出时只做切片。
+    """
+
+    def __init__(self, symbols, offsets, dates, fields):
+        self.symbols = list(symbols)
+        self.positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.offsets = offsets
+        self.dates = dates
+        self.fields = fields
+        for values in [offsets, dates] + list(fields.values()):
+            if values.flags.writeable:
+                values.flags.writeable = False
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.positions
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in [self.offsets, self.dates] + list(self.fields.values()))
+
+    # 单个标的的K线，没有时返回 None
+    def frame(self, symbol):
+        i = self.positions.get(symbol)
+        if i is None:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        index = pd.DatetimeIndex(self.dates[start:end].view('datetime64[ns]'), name='Date')
+        return pd.DataFrame({field: values[start:end] for field, values in self.fields.items()}, index=index,
+                            copy=False)
+
+    def frames(self, symbols):
+        """返回 symbol→K线，没有的标的不包含在结果中"""
+        return {symbol: self.frame(symbol) for symbol in symbols if symbol in self.positions}
+
+    # 各标的最新K线的日期（YYYY-MM-DD）
+    def last_dates(self):
+        ends = self.offsets[1:] - 1
+        lengths = np.diff(self.offsets)
+        days = self.dates[ends[lengths > 0]].view('datetime64[ns]').astype('datetime64[D]').astype(str)
+        return dict(zip(np.array(self.symbols, dtype=object)[lengths > 0], days.tolist()))
+
+    # 长表形式（symbol, Date, 各字段），用于写出文件
+    def to_arrow(self):
+        lengths = np.diff(self.offsets)
+        symbols = pa.DictionaryArray.from_arrays(np.repeat(np.arange(len(self.symbols), dtype=np.int32), lengths),
+                                                 pa.array(self.symbols, pa.string()))
+        columns = {'symbol': symbols, 'Date': pa.array(self.dates.view('datetime64[ns]'))}
+        # 直接从数组构造，NaN 保持为 NaN（不转成 null），读回时可以零复制
+        columns.update({field: pa.array(values) for field, values in self.fields.items()})
+        return pa.table(columns)
+
+    @classmethod
+    def from_arrow(cls, table):
+        """从 to_arrow 写出的长表恢复；同一标的的K线必须相邻
+
+        数据没有缺失值且只有一个分块时数组直接引用表的内存（如内存映射的文件），不复制。
+        """
+        symbols = pc.dictionary_encode(table['symbol']).combine_chunks()
+        codes = symbols.indices.to_numpy(zero_copy_only=False)
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], np.int64)
+        offsets = np.r_[starts, len(codes)].astype(np.int64)
+        names = symbols.dictionary.to_pylist()
+
+        def column(name, dtype):
+            values = table[name].combine_chunks().to_numpy(zero_copy_only=False)
+            if values.dtype == dtype:
+                return values
+            return (np.nan_to_num(values) if np.issubdtype(dtype, np.integer) else values).astype(dtype)
+
+        dates = column('Date', 'datetime64[ns]').view(np.int64)
+        fields = {field: column(field, dtype) for field, dtype in BLOCK_FIELDS.items() if field in table.column_names}
+        return cls([names[code] for code in codes[starts]], offsets, dates, fields)
+
+
+# 把各标的调整后的K线打包成 BarBlock，同时计算整段历史的生命线序列
+def build_bar_block(frames):
+    frames = {symbol: df for symbol, df in frames.items() if df is not None and not df.empty}
+    symbols = list(frames)
+    lengths = np.array([len(frames[symbol]) for symbol in symbols], dtype=np.int64)
+    offsets = np.r_[0, np.cumsum(lengths)].astype(np.int64)
+
+    # 所有标的对齐成二维数组后一次计算EMA，前面补齐的NaN不影响结果
+    panel = build_panel(frames, fields=('Close',))
+    ema = pd.DataFrame(panel['Close']).ewm(span=EMA_SPAN, adjust=False).mean().to_numpy()
+
+    dates = np.empty(offsets[-1], dtype=np.int64)
+    fields = {field: np.empty(offsets[-1], dtype=dtype) for field, dtype in BLOCK_FIELDS.items()}
+    for j, symbol in enumerate(symbols):
+        df = frames[symbol]
+        start, end = offsets[j], offsets[j + 1]
+        dates[start:end] = np.asarray(df.index, dtype='datetime64[ns]').view(np.int64)
+        for field, values in fields.items():
+            if field == 'ema61':
+                values[start:end] = ema[len(ema) - len(df):, j]
+            elif field == 'Volume':
+                values[start:end] = np.nan_to_num(df[field].to_numpy(dtype='float64')).round()
+            else:
+                values[start:end] = df[field].to_numpy(dtype='float64')
+    return BarBlock(symbols, offsets, dates, fields)
@@ -0,0 +1,121 @@
+import json
+import os
+import re
+import threading
+import pandas as pd
+
+# 本地K线存储目录，可通过环境变量覆盖
+DATA_DIR = os.environ.get(
+    "LEO_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"),
+)
+
+# 存储的标准列
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+# 标的代码中不能直接用作文件名的字符替换为下划线
+def safe_name(symbol):
+    return re.sub(r'[^0-9A-Za-z.]', '_', symbol)
+
+
+# 原子写入：先写同目录下的临时文件再替换，读取方不会读到写了一半的文件
+def write_atomic(path, write):
+    """write(tmp_path) 负责写出临时文件"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+# 原子写入JSON文件，其余参数传给 json.dump
+def write_json_atomic(path, data, **kwargs):
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, **kwargs)
+    write_atomic(path, write)
+
+
+# 每个 数据源/标的 对应一个Parquet文件
+def bar_path(source, symbol):
+    """返回 数据源/标的 对应的Parquet文件路径"""
+    return os.path.join(DATA_DIR, "bars", source, f"{safe_name(symbol)}.parquet")
+
+
+# 统一K线格式：单层列名、无时区的日期索引、按日期升序
+def normalize_bars(df):
+    """把数据源返回的K线整理为标准OHLCV格式"""
+    if df is None or df.empty:
+        return None
+
+    df = df.copy()
+
+    # yfinance 返回 (Price, Ticker) 两层列名
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+
+    columns = [col for col in BAR_COLUMNS if col in df.columns]
+    df = df[columns].astype('float64')
+    df.columns.name = None
+
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    df.index = index.normalize()
+    df.index.name = 'Date'
+
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    return df
+
+
+# 读取本地K线
+def load_bars(source, symbol):
+    path = bar_path(source, symbol)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        df = pd.read_parquet(path)
+    except Exception:
+        # 文件损坏时视为无缓存，下次刷新会重新全量拉取
+        return None
+
+    return df if not df.empty else None
+
+
+# 原子写入本地K线，避免读到写了一半的文件
+def save_bars(source, symbol, df):
+    write_atomic(bar_path(source, symbol), df.to_parquet)
+
+
+# 最后一根已存储K线的日期
+def last_bar_date(df):
+    if df is None or df.empty:
+        return None
+    return df.index[-1]
+
+
+# 合并新旧K线，同一日期以新数据为准（最后一根K线盘中会变化）
+def merge_bars(stored, fresh):
+    """合并本地K线和新拉取的K线"""
+    fresh = normalize_bars(fresh)
+
+    if stored is None or stored.empty:
+        return fresh
+    if fresh is None:
+        return stored
+
+    merged = pd.concat([stored, fresh])
+    merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+    return merged
+
+
+# 增量更新：合并新数据并写回本地
+def update_bars(source, symbol, stored, fresh):
+    """stored 为调用方已读取的本地K线（load_bars 的结果），把新拉取的K线合并进本地存储，返回合并后的完整历史"""
+    merged = merge_bars(stored, fresh)
+
+    if merged is not None and (stored is None or not merged.equals(stored)):
+        save_bars(source, symbol, merged)
+
+    return merged
@@ -0,0 +1,86 @@
+"""命令行批处理：不启动Streamlit，计算整个仪表板并写出结果文件
+
+适合在各市场收盘后由cron调用，例如:
+    python batch.py --output-dir output --format parquet --timeout 600
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from bar_store import write_atomic
+from pipeline import load_portfolio, run_pipeline
+from snapshot import DASHBOARD_COLUMNS
+
+
+# 写出计算结果
+def write_outputs(result, output_dir, fmt, started_at, elapsed):
+    os.makedirs(output_dir, exist_ok=True)
+
+    dashboard = pd.DataFrame(result['rows'], columns=DASHBOARD_COLUMNS)
+    bars = result['bars'].to_arrow().to_pandas()
+
+    if fmt == 'parquet':
+        write_atomic(os.path.join(output_dir, 'dashboard.parquet'), lambda path: dashboard.to_parquet(path))
+        write_atomic(os.path.join(output_dir, 'bars.parquet'), lambda path: bars.to_parquet(path))
+    else:
+        write_atomic(os.path.join(output_dir, 'dashboard.json'),
+                      lambda path: dashboard.to_json(path, orient='records', force_ascii=False, indent=2))
+        write_atomic(os.path.join(output_dir, 'bars.json'),
+                      lambda path: bars.to_json(path, orient='records', date_format='iso', force_ascii=False))
+
+    # 运行摘要：各标的获取状态、检测到的事件、耗时统计和结构化的错误信息
+    summary = {
+        "started_at": started_at,
+        "elapsed_seconds": round(elapsed, 3),
+        "symbols": len(result['fetch_status']),
+        "succeeded": sum(1 for status in result['fetch_status'].values() if status['ok']),
+        "rows": len(dashboard),
+        "fetch_status": result['fetch_status'],
+        "dividend_events": result['dividend_events'],
+        "metrics": result['metrics'],
+        "errors": result['messages'],
+    }
+
+    def write_summary(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2, default=str)
+
+    write_atomic(os.path.join(output_dir, 'run.json'), write_summary)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="不启动Streamlit计算仪表板并写出结果")
+    parser.add_argument('--output-dir', default='output', help="结果输出目录")
+    parser.add_argument('--format', choices=['parquet', 'json'], default='parquet', help="仪表板和K线的文件格式")
+    parser.add_argument('--timeout', type=float, default=600, help="数据获取的最长时间（秒），超时的标的记为失败")
+    parser.add_argument('--watchlist', help="标的文件（CSV/YAML），默认使用 LEO_WATCHLIST 或内置组合")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    started_at = datetime.now().isoformat(timespec='seconds')
+    start = time.monotonic()
+    result = run_pipeline(load_portfolio(args.watchlist), timeout=args.timeout)
+    summary = write_outputs(result, args.output_dir, args.format, started_at, time.monotonic() - start)
+
+    logging.info("完成: %d/%d 个标的获取成功，输出 %d 行，耗时 %.1f 秒",
+                 summary['succeeded'], summary['symbols'], summary['rows'], summary['elapsed_seconds'])
+    return 0 if summary['rows'] else 1
+
+
+if __name__ == "__main__":
+    exit_code = main()
+    # 超时未完成的获取线程仍在运行时直接退出，保证运行时间有上限
+    if threading.active_count() > 1:
+        logging.shutdown()
+        sys.stdout.flush()
+        os._exit(exit_code)
+    sys.exit(exit_code)
@@ -0,0 +1,137 @@
+"""离线性能基准：用本地模拟数据源代替 yfinance/akshare，测量刷新各阶段的耗时
+
+每个组合规模在独立的子进程和临时数据目录中运行两次：第一次为冷启动（本地没有K线和指标状态），
+第二次为增量刷新。结果可追加到JSONL文件，用于对比缓存、并发和向量化改动前后的表现。
+    python benchmark.py                                       # 19 / 500 / 5000 个标的
+    python benchmark.py --sizes 19,500 --latency-ms 50 --failure-rate 0.02
+    python benchmark.py --fixtures data/bars                  # 回放本地K线存储中录制的数据
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# 报告中各阶段的顺序
+REPORT_STAGES = ['fetch', 'dividend_detection', 'adjust', 'indicators', 'timeframes', 'bar_block', 'table', 'chart',
+                 'total']
+
+
+# 在当前进程中测量一个组合规模（由子进程调用）
+def run_size(size, args):
+    """返回每次运行的各阶段耗时；调用前 LEO_DATA_DIR 已指向临时目录"""
+    import pandas as pd
+
+    import fetch_engine
+    from dashboard_view import build_chart, format_dashboard_table
+    from fake_provider import FakeProvider, install, synthetic_portfolio
+    from pipeline import run_pipeline
+
+    # 默认去掉限流的速率限制（保留并发上限），只测量本地处理的耗时
+    if not args.rate_limits:
+        for limits in fetch_engine.PROVIDER_LIMITS.values():
+            limits.update(rate=1e9, burst=1e9)
+
+    portfolio = synthetic_portfolio(size)
+    provider = FakeProvider(universe=[(item['source'], item['symbol']) for item in portfolio],
+                            fixtures_dir=args.fixtures, latency=args.latency_ms / 1000,
+                            jitter=args.jitter_ms / 1000, failure_rate=args.failure_rate, seed=args.seed)
+    provider.preload()
+
+    runs = []
+    with install(provider):
+        for run in range(args.runs):
+            calls, failures = provider.calls, provider.failures
+            result = run_pipeline(portfolio, max_workers=args.workers)
+            stages = dict(result['metrics']['stages'])
+
+            start = time.perf_counter()
+            format_dashboard_table(pd.DataFrame(result['rows']))
+            stages['table'] = time.perf_counter() - start
+
+            # 图表包括生成Plotly图形和序列化（页面发送给浏览器前需要序列化）
+            if result['rows']:
+                row = result['rows'][0]
+                start = time.perf_counter()
+                build_chart(result['bars'].frame(row['symbol']), row['name']).to_json()
+                stages['chart'] = time.perf_counter() - start
+
+            runs.append({
+                "size": size,
+                "run": "cold" if run == 0 else "warm",
+                "stages": {name: round(seconds, 4) for name, seconds in stages.items()},
+                "rows": len(result['rows']),
+                "calls": provider.calls - calls,
+                "failures": provider.failures - failures,
+                "provider_calls": result['metrics']['calls'],
+                "counters": result['metrics']['counters'],
+            })
+    return runs
+
+
+# 在独立子进程中运行一个规模，避免进程内缓存和数据目录互相影响
+def run_size_isolated(size, args, argv):
+    with tempfile.TemporaryDirectory(prefix="leo-bench-") as data_dir:
+        env = dict(os.environ, LEO_DATA_DIR=data_dir)
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--child-size', str(size)] + argv,
+                                   env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{size} 个标的的基准运行失败:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def print_header():
+    print(f"{'size':>6} {'run':>5} " + " ".join(f"{name:>18}" for name in REPORT_STAGES)
+          + f" {'calls':>7} {'fail':>5} {'rows':>6}")
+
+
+def print_report(runs):
+    for run in runs:
+        stages = " ".join(f"{run['stages'].get(name, float('nan')):>18.3f}" for name in REPORT_STAGES)
+        print(f"{run['size']:>6} {run['run']:>5} {stages} {run['calls']:>7} {run['failures']:>5} {run['rows']:>6}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description="用模拟数据源离线测量刷新各阶段的耗时")
+    parser.add_argument('--sizes', default="19,500,5000", help="组合规模，逗号分隔")
+    parser.add_argument('--runs', type=int, default=2, help="每个规模的运行次数（第一次为冷启动）")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="每次请求的模拟延迟（毫秒）")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="延迟的随机附加量上限（毫秒）")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="每次请求抛出网络错误的概率")
+    parser.add_argument('--fixtures', help="录制数据目录，结构与 data/bars 相同")
+    parser.add_argument('--rate-limits', action='store_true', help="保留真实的限流速率")
+    parser.add_argument('--workers', type=int, default=8, help="获取线程数")
+    parser.add_argument('--seed', type=int, default=0, help="延迟和故障的随机种子")
+    parser.add_argument('--output', help="结果追加写入的JSONL文件")
+    parser.add_argument('--child-size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.fixtures:
+        args.fixtures = os.path.abspath(args.fixtures)
+
+    if args.child_size is not None:
+        print(json.dumps(run_size(args.child_size, args), ensure_ascii=False, default=str))
+        return 0
+
+    runs = []
+    print_header()
+    for size in [int(size) for size in args.sizes.split(',') if size.strip()]:
+        size_runs = run_size_isolated(size, args, argv)
+        print_report(size_runs)
+        sys.stdout.flush()
+        runs.extend(size_runs)
+
+    if args.output:
+        started = datetime.now().astimezone().isoformat(timespec='seconds')
+        with open(args.output, "a", encoding="utf-8") as f:
+            for run in runs:
+                f.write(json.dumps(dict(run, time=started, options=vars(args)), ensure_ascii=False,
+                                   default=str) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from bar_store import DATA_DIR, write_json_atomic
+
+ACTIONS_PATH = os.path.join(DATA_DIR, "corporate_actions.json")
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+
+# 支持的公司行动类型
+# cash_dividend: 现金分红，分红前价格减去 dividend_per_share
+# factor: 比例调整，分红前价格乘以 adjustment_factor，成交量除以 adjustment_factor
+# split: 拆股/送转，split_ratio 为每股拆成的股数，等价于 factor = 1 / split_ratio
+ACTION_TYPES = ("cash_dividend", "factor", "split")
+
+_table = None
+_table_mtime = None
+_lock = threading.Lock()
+
+# 复权结果缓存：symbol→(缓存键, 复权后的K线)
+_adjusted_cache = {}
+
+
+def _actions_mtime():
+    try:
+        return os.stat(ACTIONS_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+# 读取公司行动表，首次使用时用 seed 初始化
+def load_actions(seed=None):
+    """返回 {"version": int, "events": [...]}
+
+    文件被其他进程（如后台刷新进程和页面）修改后重新读取。
+    """
+    global _table, _table_mtime
+    with _lock:
+        mtime = _actions_mtime()
+        if _table is None or (mtime is not None and mtime != _table_mtime):
+            try:
+                with open(ACTIONS_PATH, encoding="utf-8") as f:
+                    _table = json.load(f)
+                _table_mtime = mtime
+            except (OSError, ValueError):
+                if _table is not None:
+                    return _table
+                _table = {"version": 0, "events": []}
+                for symbol, adjustment in (seed or {}).items():
+                    _table["events"].append(dict(adjustment, symbol=symbol))
+                if _table["events"]:
+                    _save_actions()
+        return _table
+
+
+def _save_actions():
+    global _table_mtime
+    write_json_atomic(ACTIONS_PATH, _table, ensure_ascii=False, indent=2)
+    _table_mtime = _actions_mtime()
+
+
+# 新增一条公司行动并持久化，同一标的同一日期同一类型的事件会被替换
+def add_action(symbol, date, adjustment_type, **values):
+    if adjustment_type not in ACTION_TYPES:
+        raise ValueError(f"不支持的调整类型: {adjustment_type}")
+
+    event = dict(values, symbol=symbol, date=date, adjustment_type=adjustment_type)
+    event.setdefault("confirmed", True)
+
+    load_actions()
+    with _lock:
+        table = _table
+        table["events"] = [
+            e for e in table["events"]
+            if not (e["symbol"] == symbol and e["date"] == date and e["adjustment_type"] == adjustment_type)
+        ]
+        table["events"].append(event)
+        table["version"] += 1
+        _save_actions()
+
+    return event
+
+
+# 标的已确认的公司行动，按日期升序
+def symbol_actions(symbol):
+    events = [e for e in load_actions()["events"] if e["symbol"] == symbol and e.get("confirmed", False)]
+    return sorted(events, key=lambda e: e["date"])
+
+
+# 标的公司行动的版本标识，只随该标的的事件变化
+def symbol_version(symbol):
+    events = symbol_actions(symbol)
+    return json.dumps(events, sort_keys=True) if events else None
+
+
+# 单个事件对价格的变换：p → p * factor - dividend
+def _event_terms(event):
+    if event["adjustment_type"] == "cash_dividend":
+        return 1.0, float(event.get("dividend_per_share", 0.0))
+    if event["adjustment_type"] == "split":
+        return 1.0 / float(event["split_ratio"]), 0.0
+    return float(event.get("adjustment_factor", 1.0)), 0.0
+
+
+# 累计复权因子
+def adjustment_vectors(index, events):
+    """返回每根K线的 (价格乘数, 价格偏移, 成交量除数)
+
+    事件按日期升序作用于其日期之前的K线：先发生的事件先调整，后发生的事件在此基础上再调整。
+    """
+    count = len(events)
+    scale = np.ones(count + 1)
+    offset = np.zeros(count + 1)
+    volume_divisor = np.ones(count + 1)
+
+    # 从最近的事件往前累积：events[k:] 的复合变换
+    for k in range(count - 1, -1, -1):
+        factor, dividend = _event_terms(events[k])
+        scale[k] = scale[k + 1] * factor
+        offset[k] = offset[k + 1] - dividend * scale[k + 1]
+        volume_divisor[k] = volume_divisor[k + 1] * factor
+
+    # 每根K线受其日期之后的所有事件影响
+    event_dates = pd.to_datetime([e["date"] for e in events]).values
+    position = np.searchsorted(event_dates, np.asarray(index, dtype='datetime64[ns]'), side='right')
+    return scale[position], offset[position], volume_divisor[position]
+
+
+# 对K线应用所有已确认的公司行动
+def apply_actions(df, symbol):
+    """返回复权后的新K线，不修改输入；结果按公司行动表版本缓存"""
+    events = symbol_actions(symbol)
+    if df is None or df.empty or not events:
+        return df
+
+    version = load_actions()["version"]
+    key = (version, len(df), df.index[0], df.index[-1], float(df['Close'].iloc[-1]))
+    cached = _adjusted_cache.get(symbol)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    scale, offset, volume_divisor = adjustment_vectors(df.index, events)
+
+    # 所有价格列一次乘加完成
+    columns = [col for col in PRICE_COLUMNS if col in df.columns]
+    prices = df[columns].to_numpy(dtype='float64') * scale[:, None] + offset[:, None]
+    adjusted = pd.DataFrame(prices, index=df.index, columns=columns)
+    if 'Volume' in df.columns:
+        adjusted['Volume'] = df['Volume'].to_numpy(dtype='float64') / volume_divisor
+    adjusted = adjusted[[col for col in df.columns if col in adjusted.columns]]
+
+    _adjusted_cache[symbol] = (key, adjusted)
+    return adjusted
@@ -0,0 +1,198 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from indicators import EMA_SPAN
+
+
+# 仪表板表格显示的列和列名
+DISPLAY_COLUMNS = ['symbol', 'name', 'category', 'Close', 'ema61',
+                   'trend_status', 'trend_W', 'trend_M', 'dynamic_exit', 'exit_distance_pct', 'action']
+COLUMN_NAMES = {'ema61': '生命线', 'trend_W': '周线趋势', 'trend_M': '月线趋势'}
+
+# 个股图表的时间范围（交易日数，None 为全部历史）
+CHART_RANGES = {"6个月": 126, "1年": 252, "3年": 756, "全部": None}
+
+# 图表最多绘制的K线数，所选范围内更多的K线按相邻区间合并成一根
+MAX_CHART_POINTS = 600
+
+# 折线点数超过该值时使用WebGL绘制
+WEBGL_THRESHOLD = 1000
+
+# 小图总览最多显示的标的数和每个小图的点数
+OVERVIEW_MAX_SYMBOLS = 48
+OVERVIEW_POINTS = 120
+OVERVIEW_COLUMNS = 4
+
+# 已生成的图表：缓存键→Figure，同一进程内的所有会话共享，按最近使用淘汰
+CHART_CACHE_SIZE = 64
+_chart_cache = OrderedDict()
+_chart_lock = threading.Lock()
+
+# 合并K线时各列的取值方式，其余列（如生命线）取区间最后一根的值
+OHLC_REDUCE = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Volume': 'sum'}
+
+# 数字列的显示格式（printf 格式或 Streamlit 的预设格式），数据本身保持数值类型以便排序
+COLUMN_FORMATS = {'Close': '%.4f', '生命线': '%.4f', 'dynamic_exit': '%.4f', 'exit_distance_pct': 'percent'}
+
+
+# 所有标的都没有该周期指标（历史都不够长）时不显示该周期的趋势列
+def _empty_timeframe(df_dashboard, col):
+    if not col.startswith('trend_'):
+        return False
+    ema_col = col.replace('trend_', 'ema61_', 1)
+    return ema_col in df_dashboard.columns and df_dashboard[ema_col].isna().all()
+
+
+# 仪表板表格：选择显示的列并重命名，数字列不转换成字符串，由表格组件按 COLUMN_FORMATS 显示
+def format_dashboard_table(df_dashboard):
+    available_columns = [col for col in DISPLAY_COLUMNS if col in df_dashboard.columns
+                         and not _empty_timeframe(df_dashboard, col)]
+    return df_dashboard[available_columns].rename(columns=COLUMN_NAMES)
+
+
+# 按类别和操作建议筛选，未选择时不筛选
+def filter_dashboard(df_dashboard, categories=None, actions=None):
+    mask = pd.Series(True, index=df_dashboard.index)
+    if categories:
+        mask &= df_dashboard['category'].isin(categories)
+    if actions:
+        mask &= df_dashboard['action'].isin(actions)
+    return df_dashboard[mask]
+
+
+# 相邻K线合并成不超过 max_points 根，从最后一根向前分组，最新的区间总是以最新K线结束
+def downsample_ohlc(df, max_points=MAX_CHART_POINTS):
+    """返回 (合并后的K线, 每根包含的原始K线数)；合并后的日期为区间最后一个交易日"""
+    n = len(df)
+    if not max_points or n <= max_points:
+        return df, 1
+    size = -(-n // max_points)
+    starts = np.unique(np.r_[0, np.arange(n % size, n, size)])
+    ends = np.r_[starts[1:] - 1, n - 1]
+
+    reduced = {}
+    for col in df.columns:
+        values = df[col].to_numpy(dtype='float64')
+        how = OHLC_REDUCE.get(col)
+        if how == 'first':
+            reduced[col] = values[starts]
+        elif how == 'max':
+            reduced[col] = np.fmax.reduceat(values, starts)
+        elif how == 'min':
+            reduced[col] = np.fmin.reduceat(values, starts)
+        elif how == 'sum':
+            reduced[col] = np.add.reduceat(np.nan_to_num(values), starts)
+        else:
+            reduced[col] = values[ends]
+    return pd.DataFrame(reduced, index=df.index[ends]), size
+
+
+# 生命线序列：快照中已计算的直接使用，没有时（旧快照）按整段历史计算
+def _ema_series(df):
+    if 'ema61' in df.columns:
+        return df
+    return df.assign(ema61=df['Close'].ewm(span=EMA_SPAN, adjust=False).mean())
+
+
+def _line_trace(points):
+    return go.Scattergl if points > WEBGL_THRESHOLD else go.Scatter
+
+
+# 个股K线图：K线、61日EMA，纵轴范围包含两者
+def build_chart(df_selected, name, bars=None, max_points=MAX_CHART_POINTS):
+    """bars 为显示的最近交易日数（None 为全部），范围内超过 max_points 根K线时合并显示"""
+    df_selected = _ema_series(df_selected)
+    if bars:
+        df_selected = df_selected.iloc[-bars:]
+    df_selected, size = downsample_ohlc(df_selected, max_points)
+    ema61 = df_selected['ema61']
+
+    fig = go.Figure()
+
+    # 添加K线
+    fig.add_trace(go.Candlestick(
+        x=df_selected.index,
+        open=df_selected['Open'],
+        high=df_selected['High'],
+        low=df_selected['Low'],
+        close=df_selected['Close'],
+        name='K线'
+    ))
+
+    # 添加EMA61线
+    fig.add_trace(_line_trace(len(df_selected))(
+        x=df_selected.index,
+        y=ema61,
+        name='61日EMA',
+        line=dict(color='orange', width=2)
+    ))
+
+    # 优化Y轴范围 - 修复错误
+    try:
+        low_min = float(df_selected['Low'].min())
+        high_max = float(df_selected['High'].max())
+        ema61_min = float(ema61.min())
+        ema61_max = float(ema61.max())
+
+        y_min = min(low_min, ema61_min) * 0.98
+        y_max = max(high_max, ema61_max) * 1.02
+    except:
+        # 如果计算Y轴范围出错，使用默认范围
+        y_min = float(df_selected['Low'].min()) * 0.98
+        y_max = float(df_selected['High'].max()) * 1.02
+
+    title = f"{name} 技术分析"
+    if size > 1:
+        title += f"（每根K线合并 {size} 个交易日）"
+    fig.update_layout(
+        title=title,
+        xaxis_title='日期',
+        yaxis_title='价格',
+        xaxis_rangeslider_visible=False,
+        yaxis=dict(range=[y_min, y_max])
+    )
+
+    return fig
+
+
+# 多个标的的收盘价和生命线小图，使用WebGL绘制
+def build_overview(frames, names, bars=None, points=OVERVIEW_POINTS, columns=OVERVIEW_COLUMNS):
+    """frames 为 symbol→K线，names 为 symbol→名称"""
+    symbols = list(frames)
+    rows = max(1, -(-len(symbols) // columns))
+    fig = make_subplots(rows=rows, cols=columns, subplot_titles=[names.get(symbol, symbol) for symbol in symbols],
+                        vertical_spacing=min(0.08, 0.5 / rows), horizontal_spacing=0.04)
+    for i, symbol in enumerate(symbols):
+        df = _ema_series(frames[symbol])
+        if bars:
+            df = df.iloc[-bars:]
+        df, _ = downsample_ohlc(df[['Close', 'ema61']], points)
+        row, col = i // columns + 1, i % columns + 1
+        fig.add_trace(go.Scattergl(x=df.index, y=df['Close'], name=symbol, mode='lines',
+                                   line=dict(color='steelblue', width=1)), row=row, col=col)
+        fig.add_trace(go.Scattergl(x=df.index, y=df['ema61'], name=f"{symbol} 61日EMA", mode='lines',
+                                   line=dict(color='orange', width=1)), row=row, col=col)
+    fig.update_layout(height=180 * rows, showlegend=False, margin=dict(l=20, r=20, t=40, b=20))
+    fig.update_xaxes(showticklabels=False)
+    return fig
+
+
+# 按缓存键返回已生成的图表，没有时调用 build 生成
+def cached_chart(key, build):
+    """key 应包含数据版本（如快照版本），数据更新后自动使用新的图表"""
+    with _chart_lock:
+        if key in _chart_cache:
+            _chart_cache.move_to_end(key)
+            return _chart_cache[key]
+
+    fig = build()
+    with _chart_lock:
+        _chart_cache[key] = fig
+        while len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
+    return fig
@@ -0,0 +1,227 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from bar_store import DATA_DIR, write_json_atomic
+from indicators import ATR_WINDOW, compute_panel_indicators
+
+SCAN_PATH = os.path.join(DATA_DIR, "dividend_scan.json")
+
+# 从未扫描过的标的从该日期开始扫描
+SCAN_EPOCH = pd.Timestamp("1900-01-01")
+
+# 自身跌幅和相对同类/基准的超额跌幅都至少为该比例
+EVENT_MIN_DROP = 0.03
+# 自身跌幅和超额跌幅都至少为前一日ATR的倍数，波动大的标的需要更大的跌幅才算异常
+EVENT_ATR_MULTIPLE = 3.0
+
+# 同类别没有其他标的时，按类别前缀使用的市场基准
+MARKET_BENCHMARKS = {"A股": "000001", "美股": "^IXIC"}
+
+_lock = threading.Lock()
+
+
+# 读取扫描记录：每个标的已扫描到的日期和最后一根K线，已发现的事件，以及最后一根K线上的事件
+def _load_scan():
+    try:
+        with open(SCAN_PATH, encoding="utf-8") as f:
+            scan = json.load(f)
+    except (OSError, ValueError):
+        scan = {}
+    scan.setdefault("scanned", {})
+    scan.setdefault("events", [])
+    scan.setdefault("last", {})
+    scan.setdefault("unsettled", [])
+    return scan
+
+
+def _save_scan(scan):
+    write_json_atomic(SCAN_PATH, scan, ensure_ascii=False, indent=2)
+
+
+# 标的的参照分组：同类别的标的，类别只有一个标的时用市场基准，基准本身则参照同市场的其他标的
+def reference_groups(items):
+    """返回 symbol→分组键，以及 分组键→成员；参照涨跌为分组中除自身以外成员的平均涨跌，没有分组的标的不扣除参照"""
+    categories = {}
+    for item in items:
+        categories.setdefault(item['category'], []).append(item['symbol'])
+    available = {item['symbol'] for item in items}
+
+    keys = {}
+    members = {}
+    for item in items:
+        symbol, category = item['symbol'], item['category']
+        if len(categories[category]) > 1:
+            keys[symbol] = ('category', category)
+            members[keys[symbol]] = categories[category]
+            continue
+        for prefix, benchmark in MARKET_BENCHMARKS.items():
+            if not category.startswith(prefix):
+                continue
+            if benchmark != symbol and benchmark in available:
+                keys[symbol] = ('benchmark', benchmark)
+                members[keys[symbol]] = [benchmark]
+            else:
+                keys[symbol] = ('market', prefix)
+                if keys[symbol] not in members:
+                    members[keys[symbol]] = [other['symbol'] for other in items
+                                             if other['category'].startswith(prefix)]
+            break
+    return keys, members
+
+
+# 各标的每天的参照涨跌：按分组求和后扣除标的自身，不构造 标的 × 标的 的权重矩阵
+def _reference_change(change, symbols, keys, members):
+    """change 为 日期 × 标的 的涨跌（缺失为 NaN）；分组成员不在 symbols 中的忽略"""
+    position = {symbol: j for j, symbol in enumerate(symbols)}
+    observed = ~np.isnan(change)
+    values = np.where(observed, change, 0.0)
+
+    # 只计算用到的分组，最后一列为空分组（没有参照的标的）
+    used = list(dict.fromkeys(keys[symbol] for symbol in symbols if symbol in keys))
+    group_index = {key: g for g, key in enumerate(used)}
+    sums = np.zeros((len(values), len(used) + 1))
+    counts = np.zeros((len(values), len(used) + 1))
+    for key, g in group_index.items():
+        columns = [position[symbol] for symbol in members[key] if symbol in position]
+        sums[:, g] = values[:, columns].sum(axis=1)
+        counts[:, g] = observed[:, columns].sum(axis=1)
+
+    groups = np.array([group_index.get(keys.get(symbol), len(used)) for symbol in symbols], dtype=np.int64)
+    own = np.array([keys.get(symbol) is not None and keys[symbol][0] != 'benchmark' for symbol in symbols])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        reference = (sums[:, groups] - values * own) / (counts[:, groups] - observed * own)
+    return np.nan_to_num(reference, nan=0.0)
+
+
+# 各标的的K线在共同日期轴上的行号，用于把右对齐的面板列展开成 日期 × 标的
+def _date_positions(frames, symbols):
+    indexes = [np.asarray(frames[symbol].index, dtype='datetime64[ns]') for symbol in symbols]
+    dates = np.unique(np.concatenate(indexes)) if indexes else np.array([], dtype='datetime64[ns]')
+    return dates, [np.searchsorted(dates, index) for index in indexes]
+
+
+def _to_wide(values, positions, rows):
+    wide = np.full((rows, values.shape[1]), np.nan)
+    for j, pos in enumerate(positions):
+        wide[pos, j] = values[values.shape[0] - len(pos):, j]
+    return wide
+
+
+# 标的最后一根K线的日期和收盘价，两者都没变时不需要重新扫描
+def _last_bar(df):
+    return [df.index[-1].strftime('%Y-%m-%d'), float(df.iat[-1, df.columns.get_loc('Close')])]
+
+
+# 在所有标的的完整历史上检测疑似除权除息事件
+def detect_events(frames, portfolio):
+    """返回疑似除权除息事件列表（含之前扫描发现的事件）
+
+    跌幅以前一日ATR衡量，并扣除同类别/市场基准当天的涨跌，避免把整体下跌误判为除权。
+    每个标的只扫描上次扫描之后的K线；最后一根K线盘中还会变化，下次仍会重新扫描，
+    最后一根K线没有变化的标的直接沿用上次的结果。只为需要扫描的标的及其参照分组计算涨跌和ATR。
+    """
+    with _lock:
+        scan = _load_scan()
+
+    items = [item for item in portfolio
+             if frames.get(item['symbol']) is not None and len(frames[item['symbol']]) >= 2]
+    scanned = {item['symbol']: pd.Timestamp(scan["scanned"][item['symbol']])
+               for item in items if item['symbol'] in scan["scanned"]}
+    last_bars = {item['symbol']: _last_bar(frames[item['symbol']]) for item in items}
+    pending = [item for item in items
+               if item['symbol'] not in scanned or scan["last"].get(item['symbol']) != last_bars[item['symbol']]]
+    if not pending:
+        return scan["events"] + scan["unsettled"]
+
+    # 需要计算的标的：待扫描的标的和它们参照分组的成员
+    keys, members = reference_groups(items)
+    needed = dict.fromkeys(item['symbol'] for item in pending)
+    for item in pending:
+        key = keys.get(item['symbol'])
+        if key is not None:
+            needed.update(dict.fromkeys(members[key]))
+
+    # 只截取需要扫描的区间，并向前多留出计算ATR所需的K线
+    earliest = min(scanned.get(item['symbol'], SCAN_EPOCH) for item in pending)
+    sliced = {}
+    for symbol in needed:
+        df = frames[symbol]
+        start = max(0, int(df.index.searchsorted(earliest)) - ATR_WINDOW - 1)
+        sliced[symbol] = df.iloc[start:]
+
+    symbols = list(sliced)
+    panel = compute_panel_indicators(sliced)
+    close = panel['Close']
+    prev_close = np.full_like(close, np.nan)
+    prev_close[1:] = close[:-1]
+    prev_atr = np.full_like(close, np.nan)
+    prev_atr[1:] = panel['atr'][:-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change = close / prev_close - 1
+
+    dates, positions = _date_positions(sliced, symbols)
+    change = _to_wide(change, positions, len(dates))
+    prev_close = _to_wide(prev_close, positions, len(dates))
+    prev_atr = _to_wide(prev_atr, positions, len(dates))
+    close = _to_wide(close, positions, len(dates))
+
+    # 参照涨跌：参照标的当天涨跌的平均值
+    reference = _reference_change(change, symbols, keys, members)
+
+    excess = change - reference
+    with np.errstate(invalid='ignore', divide='ignore'):
+        own_multiple = -change * prev_close / prev_atr
+        atr_multiple = -excess * prev_close / prev_atr
+
+    # 只检查待扫描标的上次扫描之后的日期
+    pending_symbols = {item['symbol'] for item in pending}
+    scan_from = np.array([np.datetime64(scanned.get(symbol, SCAN_EPOCH), 'ns') for symbol in symbols])
+    is_new = (dates[:, None] > scan_from[None, :]) & np.array([symbol in pending_symbols for symbol in symbols])
+    # 标的自身的跌幅和扣除参照后的跌幅都要足够大，同类上涨时小幅下跌不算事件
+    with np.errstate(invalid='ignore'):
+        flagged = (is_new & (change < -EVENT_MIN_DROP) & (excess < -EVENT_MIN_DROP)
+                   & (own_multiple >= EVENT_ATR_MULTIPLE) & (atr_multiple >= EVENT_ATR_MULTIPLE))
+
+    # 最后一根K线还可能变化，其上的事件单独保存，该标的下次重新扫描时替换
+    settled = {item['symbol']: frames[item['symbol']].index[-2] for item in pending}
+    names = {item['symbol']: item['name'] for item in items}
+    known = {(event["symbol"], event["date"]) for event in scan["events"]}
+    unsettled = [event for event in scan["unsettled"] if event["symbol"] not in pending_symbols]
+    for row, col in zip(*np.nonzero(flagged)):
+        symbol = symbols[col]
+        event_date = pd.Timestamp(dates[row])
+        if (symbol, event_date.strftime('%Y-%m-%d')) in known:
+            continue
+        current_close = float(close[row, col])
+        previous_close = float(prev_close[row, col])
+        event = {
+            "symbol": symbol,
+            "name": names[symbol],
+            "date": event_date.strftime('%Y-%m-%d'),
+            "price_change": float(change[row, col]),
+            "reference_change": float(reference[row, col]),
+            "atr_multiple": float(atr_multiple[row, col]),
+            "adjustment_factor": current_close / previous_close,
+            "prev_close": previous_close,
+            "current_close": current_close,
+        }
+        if event_date <= settled[symbol]:
+            scan["events"].append(event)
+        else:
+            unsettled.append(event)
+
+    # 记录扫描进度
+    for symbol, date in settled.items():
+        scan["scanned"][symbol] = date.strftime('%Y-%m-%d')
+        scan["last"][symbol] = last_bars[symbol]
+    scan["events"].sort(key=lambda event: (event["date"], event["symbol"]))
+    scan["unsettled"] = unsettled
+
+    with _lock:
+        _save_scan(scan)
+
+    return scan["events"] + unsettled
@@ -0,0 +1,218 @@
+"""离线数据源：代替 yfinance / akshare 返回录制的或合成的K线，可注入延迟和网络故障
+
+返回的数据格式与真实接口一致，获取、路由、重试、熔断等逻辑按真实情况运行。
+"""
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+import spot_quotes
+from bar_store import safe_name
+from pipeline import PORTFOLIO
+
+# 合成K线的起始日期
+SYNTHETIC_START = "2024-01-01"
+
+AKSHARE_COLUMNS = {'Open': '开盘', 'Close': '收盘', 'High': '最高', 'Low': '最低', 'Volume': '成交量'}
+
+
+# 场内基金代码以 1 或 5 开头，其余按股票处理
+def is_etf(symbol):
+    return symbol[:1] in ('1', '5')
+
+
+# 按组合规模生成标的列表：前面是真实的 PORTFOLIO，其余按同样的类别和数据源合成
+def synthetic_portfolio(size):
+    portfolio = [dict(item) for item in PORTFOLIO[:size]]
+    for i in range(size - len(portfolio)):
+        base = PORTFOLIO[i % len(PORTFOLIO)]
+        if base['source'] == 'akshare':
+            symbol = f"{'5' if is_etf(base['symbol']) else '6'}{i:05d}"
+        else:
+            symbol = f"SYN{i:04d}" + ('.HK' if base['symbol'].endswith('.HK') else '')
+        portfolio.append(dict(base, symbol=symbol, name=f"{base['name']}#{i}"))
+    return portfolio
+
+
+class FakeProvider:
+    """提供各标的的完整K线，并模拟每次请求的延迟和故障
+
+    fixtures_dir 为与本地K线存储相同结构的目录（<数据源>/<标的>.parquet），
+    有录制数据的标的按录制数据回放，其余标的生成可复现的随机K线。
+    """
+
+    def __init__(self, universe=(), fixtures_dir=None, latency=0.0, jitter=0.0, failure_rate=0.0, seed=0):
+        self.universe = list(universe)
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = np.random.default_rng(seed)
+        self.calls = 0
+        self.failures = 0
+        self.bars_cache = {}
+        self.akshare_cache = {}
+        self.lock = threading.Lock()
+
+    # 每次请求：模拟网络延迟，按故障率抛出网络错误
+    def request(self):
+        with self.lock:
+            self.calls += 1
+            delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self.failure_rate > 0 and self.rng.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise ConnectionError("模拟的网络故障")
+
+    def bars(self, source, symbol):
+        key = (source, symbol)
+        with self.lock:
+            if key in self.bars_cache:
+                return self.bars_cache[key]
+        df = self._fixture(source, symbol)
+        if df is None:
+            df = self._synthetic(symbol)
+        with self.lock:
+            self.bars_cache[key] = df
+        return df
+
+    # akshare 格式（中文列名、字符串日期）的完整历史，与K线共用日期索引用于按日期截取
+    def akshare_table(self, symbol):
+        with self.lock:
+            if symbol in self.akshare_cache:
+                return self.akshare_cache[symbol]
+        df = self.bars('akshare', symbol)
+        table = df.rename(columns=AKSHARE_COLUMNS).reset_index(drop=True)
+        table.insert(len(table.columns), '日期', df.index.strftime('%Y-%m-%d'))
+        with self.lock:
+            self.akshare_cache[symbol] = table
+        return table
+
+    # 预先生成全部标的的数据，基准测试计时的获取阶段不包含模拟数据的生成
+    def preload(self):
+        for source, symbol in self.universe:
+            self.bars(source, symbol)
+            if source == 'akshare':
+                self.akshare_table(symbol)
+
+    def _fixture(self, source, symbol):
+        if not self.fixtures_dir:
+            return None
+        path = os.path.join(self.fixtures_dir, source, f"{safe_name(symbol)}.parquet")
+        if not os.path.exists(path):
+            return None
+        return pd.read_parquet(path)
+
+    # 可复现的随机游走K线，每个标的的随机种子由代码决定
+    def _synthetic(self, symbol):
+        rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+        dates = pd.bdate_range(SYNTHETIC_START, pd.Timestamp.now().normalize(), name='Date')
+        close = 10 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(dates))))
+        open_ = close * (1 + rng.normal(0, 0.004, len(dates)))
+        spread = np.abs(rng.normal(0, 0.008, len(dates)))
+        return pd.DataFrame({
+            'Open': open_,
+            'High': np.maximum(open_, close) * (1 + spread),
+            'Low': np.minimum(open_, close) * (1 - spread),
+            'Close': close,
+            'Volume': rng.lognormal(13, 0.5, len(dates)).round(),
+        }, index=dates)
+
+    def last_bars(self, source, symbols):
+        return {symbol: self.bars(source, symbol).iloc[-1] for symbol in symbols}
+
+
+# 与 yfinance 模块接口一致的替身
+class FakeYFinance:
+    def __init__(self, provider):
+        self.provider = provider
+
+    def download(self, tickers, start=None, end=None, period=None, interval="1d",
+                 group_by='column', progress=False, **kwargs):
+        self.provider.request()
+        symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+
+        frames = {}
+        for symbol in symbols:
+            df = self.provider.bars('yfinance', symbol)
+            if period:
+                df = df.iloc[-int(period.rstrip('d')):]
+            else:
+                if start is not None:
+                    df = df[df.index >= pd.Timestamp(start).normalize()]
+                if end is not None:
+                    df = df[df.index < pd.Timestamp(end)]
+            if not df.empty:
+                frames[symbol] = df
+        if not frames:
+            return pd.DataFrame()
+
+        # 与真实接口一样返回 (Price, Ticker) 两层列名
+        data = pd.concat(frames, axis=1).swaplevel(0, 1, axis=1).sort_index(axis=1)
+        data.columns.names = ['Price', 'Ticker']
+        return data
+
+
+# 与 akshare 模块接口一致的替身（只实现本项目用到的接口）
+class FakeAkshare:
+    def __init__(self, provider):
+        self.provider = provider
+
+    def _hist(self, symbol, start_date, end_date):
+        index = self.provider.bars('akshare', symbol).index
+        start = index.searchsorted(pd.Timestamp(start_date))
+        end = index.searchsorted(pd.Timestamp(end_date), side='right')
+        return self.provider.akshare_table(symbol).iloc[start:end].reset_index(drop=True)
+
+    # 与真实接口一样，代码类型不匹配时返回空表
+    def fund_etf_hist_em(self, symbol, period="daily", start_date="19700101", end_date="20500101", **kwargs):
+        self.provider.request()
+        return self._hist(symbol, start_date, end_date) if is_etf(symbol) else pd.DataFrame()
+
+    def stock_zh_a_hist(self, symbol, period="daily", start_date="19700101", end_date="20500101", **kwargs):
+        self.provider.request()
+        return self._hist(symbol, start_date, end_date) if not is_etf(symbol) else pd.DataFrame()
+
+    def _spot(self, etf, columns):
+        self.provider.request()
+        symbols = [symbol for source, symbol in self.provider.universe
+                   if source == 'akshare' and is_etf(symbol) == etf]
+        rows = []
+        for symbol, bar in self.provider.last_bars('akshare', symbols).items():
+            row = {'代码': symbol}
+            row.update({target: bar[source] for source, target in columns.items()})
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def fund_etf_spot_em(self):
+        return self._spot(True, {'Open': '开盘价', 'High': '最高价', 'Low': '最低价',
+                                 'Close': '最新价', 'Volume': '成交量'})
+
+    def stock_zh_a_spot_em(self):
+        return self._spot(False, {'Open': '今开', 'High': '最高', 'Low': '最低',
+                                  'Close': '最新价', 'Volume': '成交量'})
+
+
+# 在代码块内用模拟数据源代替真实的 yfinance / akshare
+@contextmanager
+def install(provider):
+    modules = (pipeline, spot_quotes)
+    saved = [(module, module.yf, module.ak) for module in modules]
+    for module in modules:
+        module.yf = FakeYFinance(provider)
+        module.ak = FakeAkshare(provider)
+    try:
+        yield provider
+    finally:
+        for module, yf, ak in saved:
+            module.yf = yf
+            module.ak = ak
@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+# 并发获取的线程数上限
+FETCH_MAX_WORKERS = 8
+
+# 各数据源的限流配置
+# rate: 每秒允许的请求数; burst: 允许的突发请求数; concurrency: 同时进行的请求数
+# yf.download 内部使用全局共享状态，多个线程同时调用会互相覆盖结果，因此限制为1
+PROVIDER_LIMITS = {
+    "yfinance": {"rate": 2.0, "burst": 4, "concurrency": 1},
+    "akshare": {"rate": 3.0, "burst": 3, "concurrency": 4},
+}
+
+
+# 令牌桶限流器
+class TokenBucket:
+    """线程安全的令牌桶，acquire 在令牌不足时阻塞等待"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+
+                wait = (tokens - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+# 单个数据源的限流：令牌桶控制速率，信号量控制并发
+class ProviderLimiter:
+    def __init__(self, rate, burst, concurrency):
+        self.bucket = TokenBucket(rate, burst)
+        self.semaphore = threading.BoundedSemaphore(concurrency)
+
+    @contextmanager
+    def slot(self):
+        with self.semaphore:
+            self.bucket.acquire()
+            yield
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+# 获取数据源对应的限流器（按需创建，进程内共享）
+def get_limiter(source):
+    with _limiters_lock:
+        if source not in _limiters:
+            limits = PROVIDER_LIMITS.get(source, {"rate": 1.0, "burst": 1, "concurrency": 1})
+            _limiters[source] = ProviderLimiter(**limits)
+        return _limiters[source]
+
+
+# 每次请求数据源前调用
+@contextmanager
+def provider_slot(source):
+    """占用数据源的一个请求名额，超出速率或并发上限时阻塞等待"""
+    with get_limiter(source).slot():
+        yield
+
+
+# 并发执行获取任务
+def run_concurrent(items, fn, max_workers=FETCH_MAX_WORKERS, initializer=None, timeout=None):
+    """并发执行 fn(item)，按完成顺序逐个产出 (item, result, error)
+
+    结果在调用方线程中产出，调用方可以直接在循环里更新界面进度。
+    超过 timeout 秒仍未完成的任务以 TimeoutError 产出，且不再等待其结束。
+    """
+    if not items:
+        return
+
+    workers = max(1, min(max_workers, len(items)))
+    executor = ThreadPoolExecutor(max_workers=workers, initializer=initializer)
+    futures = {executor.submit(fn, item): item for item in items}
+    pending = set(futures)
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            pending.discard(future)
+            item = futures[future]
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+    except TimeoutError:
+        for future in pending:
+            future.cancel()
+            yield futures[future], None, TimeoutError(f"超过 {timeout} 秒未完成")
+    finally:
+        executor.shutdown(wait=not pending, cancel_futures=True)
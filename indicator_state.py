@@ -0,0 +1,114 @@
+import copy
+import json
+import os
+
+import numpy as np
+
+from bar_store import DATA_DIR, safe_name, write_json_atomic
+from indicators import (ATR_WINDOW, EMA_SPAN, MIN_BARS, N_PERIOD, advance, build_panel,
+                        indicator_values, init_state)
+
+STATE_DIR = os.path.join(DATA_DIR, "indicator_state")
+
+
+def state_path(symbol):
+    return os.path.join(STATE_DIR, f"{safe_name(symbol)}.json")
+
+
+# 读取标的的指标递推状态
+def load_state(symbol):
+    try:
+        with open(state_path(symbol), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# 保存标的的指标递推状态
+def save_state(symbol, record):
+    write_json_atomic(state_path(symbol), record)
+
+
+# 状态参数，参数变化时需要重建
+def _params():
+    return {"ema_span": EMA_SPAN, "atr_window": ATR_WINDOW, "n_period": N_PERIOD}
+
+
+# 已保存的状态能否直接接着用
+def _resume_position(record, df, version):
+    """返回检查点在 df 中的位置，状态失效（需要重建）时返回 None"""
+    if record is None or record.get("version") != version or record.get("params") != _params():
+        return None
+
+    checkpoint = np.datetime64(record["checkpoint_date"])
+    position = int(df.index.searchsorted(checkpoint))
+    if position >= len(df) - 1 or df.index[position] != checkpoint:
+        return None
+
+    # 检查点之前的K线被改动过（如除权调整、K线增删）
+    if position != record["bars"] - 1:
+        return None
+    close = float(df['Close'].iloc[position])
+    if not (close == record["checkpoint_close"] or (np.isnan(close) and np.isnan(record["checkpoint_close"]))):
+        return None
+
+    return position
+
+
+# 增量更新所有标的的指标
+def update_indicators(frames, versions=None):
+    """返回 symbol→最新指标，与全量计算的结果逐位一致
+
+    每个标的保存倒数第二根K线处的递推状态作为检查点（最后一根K线盘中还会变化），
+    之后只需推进检查点之后的新K线。versions 为各标的除权调整的版本，版本变化或
+    检查点处的K线被改动时从头重建。K线不足 MIN_BARS 的标的为 None。
+    """
+    versions = versions or {}
+    symbols = [symbol for symbol, df in frames.items() if df is not None and len(df) >= MIN_BARS]
+    results = {symbol: None for symbol in frames}
+    if not symbols:
+        return results
+
+    # 每个标的需要推进的K线：检查点之后的全部K线，失效的标的从第一根开始
+    state = init_state(len(symbols))
+    pending = {}
+    resumed = {}
+    for j, symbol in enumerate(symbols):
+        df = frames[symbol]
+        record = load_state(symbol)
+        position = _resume_position(record, df, versions.get(symbol))
+        if position is None:
+            pending[symbol] = df
+            resumed[symbol] = False
+            continue
+
+        for key, value in record["state"].items():
+            state[key][..., j] = value
+        pending[symbol] = df.iloc[position + 1:]
+        resumed[symbol] = True
+
+    panel = build_panel(pending)
+    high, low, close, active = panel['High'], panel['Low'], panel['Close'], panel['active']
+
+    # 推进到倒数第二根K线，作为新的检查点保存
+    _, state = advance(state, high[:-1], low[:-1], close[:-1], active[:-1])
+    for j, symbol in enumerate(symbols):
+        df = frames[symbol]
+        if resumed[symbol] and len(pending[symbol]) == 1:
+            continue
+        save_state(symbol, {
+            "version": versions.get(symbol),
+            "params": _params(),
+            "checkpoint_date": df.index[-2].strftime('%Y-%m-%d'),
+            "checkpoint_close": float(df['Close'].iloc[-2]),
+            "bars": len(df) - 1,
+            "state": {key: value[..., j].tolist() for key, value in state.items()},
+        })
+
+    # 最后一根K线在检查点状态的副本上计算
+    series, _ = advance(copy.deepcopy(state), high[-1:], low[-1:], close[-1:], active[-1:])
+    for j, symbol in enumerate(symbols):
+        results[symbol] = indicator_values(close[-1, j], series['ema'][-1, j],
+                                           series['atr'][-1, j], series['n_high'][-1, j])
+
+    return results
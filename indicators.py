@@ -0,0 +1,194 @@
+import numpy as np
+
+# 策略参数
+EMA_SPAN = 61
+ATR_WINDOW = 14
+N_PERIOD = 20
+EXIT_ATR_MULTIPLIER = 3
+
+# 计算指标所需的最少K线数
+MIN_BARS = 65
+
+
+# 把多个标的的K线对齐成 K线序号 × 标的 的二维数组
+def build_panel(frames, fields=('High', 'Low', 'Close')):
+    """按各标的自己的K线右对齐（最后一行是每个标的的最新K线），较短的历史在前面补NaN
+
+    不按日期对齐：各市场交易日不同，按共同日历对齐会让滚动窗口混入休市日。
+    """
+    symbols = list(frames)
+    lengths = np.array([len(frames[symbol]) for symbol in symbols], dtype=np.int64)
+    rows = int(lengths.max()) if len(symbols) else 0
+
+    panel = {"symbols": symbols, "lengths": lengths}
+    for field in fields:
+        values = np.full((rows, len(symbols)), np.nan)
+        for j, symbol in enumerate(symbols):
+            column = np.asarray(frames[symbol][field], dtype='float64').reshape(-1)
+            values[rows - len(column):, j] = column
+        panel[field] = values
+
+    # 每个标的真正有K线的行（前面补齐的行不参与递推）
+    panel['active'] = np.arange(rows)[:, None] >= (rows - lengths)[None, :]
+    return panel
+
+
+# 指标递推状态：每个字段是长度为标的数的数组（窗口字段为 窗口长度 × 标的数）
+def init_state(columns, atr_window=ATR_WINDOW, n_period=N_PERIOD):
+    return {
+        'bars': np.zeros(columns, dtype=np.int64),
+        'prev_close': np.full(columns, np.nan),
+        # EMA累加器
+        'ema': np.full(columns, np.nan),
+        'ema_old_wt': np.ones(columns),
+        # ATR窗口：最近 atr_window 个真实波幅及其补偿求和
+        'tr_window': np.full((atr_window, columns), np.nan),
+        'tr_pos': np.zeros(columns, dtype=np.int64),
+        'tr_sum': np.zeros(columns),
+        'tr_comp_add': np.zeros(columns),
+        'tr_comp_remove': np.zeros(columns),
+        'tr_nobs': np.zeros(columns, dtype=np.int64),
+        'tr_neg_ct': np.zeros(columns, dtype=np.int64),
+        'tr_same_ct': np.zeros(columns, dtype=np.int64),
+        'tr_prev_value': np.full(columns, np.nan),
+        # N日高点窗口：最近 n_period 个最高价
+        'high_window': np.full((n_period, columns), np.nan),
+        'high_pos': np.zeros(columns, dtype=np.int64),
+    }
+
+
+# 所有标的同时前进一根K线
+def _step(state, high, low, close, active, alpha):
+    """按pandas的计算方式逐位复现 ewm(adjust=False) / rolling().mean() / rolling().max()"""
+    columns = np.arange(len(close))
+    state['bars'] = state['bars'] + active
+
+    # 真实波幅：max(High-Low, |High-前收|, |Low-前收|)，缺失项忽略
+    prev_close = state['prev_close']
+    tr = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+    state['prev_close'] = np.where(active, close, prev_close)
+
+    # EMA：缺失值也让旧权重衰减，值相同时不重新计算以避免舍入误差
+    weighted = state['ema']
+    old_wt = state['ema_old_wt']
+    has_value = ~np.isnan(weighted) & active
+    is_observation = ~np.isnan(close) & active
+    old_wt = np.where(has_value, old_wt * (1.0 - alpha), old_wt)
+    with np.errstate(invalid='ignore'):
+        blended = (old_wt * weighted + alpha * close) / (old_wt + alpha)
+    weighted = np.where(has_value & is_observation & (weighted != close), blended, weighted)
+    old_wt = np.where(has_value & is_observation, 1.0, old_wt)
+    state['ema'] = np.where(~has_value & is_observation, close, weighted)
+    state['ema_old_wt'] = old_wt
+
+    # ATR：移出最旧的真实波幅，再加入新的（补偿求和）
+    pos = state['tr_pos']
+    sum_x = state['tr_sum']
+    removed = state['tr_window'][pos, columns]
+    valid = active & ~np.isnan(removed)
+    y = -removed - state['tr_comp_remove']
+    t = sum_x + y
+    state['tr_comp_remove'] = np.where(valid, t - sum_x - y, state['tr_comp_remove'])
+    sum_x = np.where(valid, t, sum_x)
+    state['tr_nobs'] = state['tr_nobs'] - valid
+    state['tr_neg_ct'] = state['tr_neg_ct'] - (valid & np.signbit(removed))
+
+    valid = active & ~np.isnan(tr)
+    y = tr - state['tr_comp_add']
+    t = sum_x + y
+    state['tr_comp_add'] = np.where(valid, t - sum_x - y, state['tr_comp_add'])
+    state['tr_sum'] = sum_x = np.where(valid, t, sum_x)
+    state['tr_nobs'] = nobs = state['tr_nobs'] + valid
+    state['tr_neg_ct'] = neg_ct = state['tr_neg_ct'] + (valid & np.signbit(tr))
+    same_ct = np.where(valid, np.where(tr == state['tr_prev_value'], state['tr_same_ct'] + 1, 1),
+                       state['tr_same_ct'])
+    state['tr_same_ct'] = same_ct
+    state['tr_prev_value'] = prev_value = np.where(valid, tr, state['tr_prev_value'])
+
+    window = state['tr_window'].shape[0]
+    state['tr_window'][pos[active], columns[active]] = tr[active]
+    state['tr_pos'] = np.where(active, (pos + 1) % window, pos)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        atr = sum_x / nobs
+    atr = np.where(same_ct >= nobs, prev_value, atr)
+    atr = np.where((neg_ct == 0) & (atr < 0), 0.0, atr)
+    atr = np.where((neg_ct == nobs) & (atr > 0), 0.0, atr)
+    atr = np.where(nobs >= window, atr, np.nan)
+
+    # N日高点：窗口未满或含缺失值时为NaN
+    pos = state['high_pos']
+    state['high_window'][pos[active], columns[active]] = high[active]
+    state['high_pos'] = np.where(active, (pos + 1) % state['high_window'].shape[0], pos)
+    n_high = state['high_window'].max(axis=0)
+
+    return state['ema'].copy(), atr, n_high
+
+
+# 从给定状态出发，按行推进若干根K线
+def advance(state, high, low, close, active=None, ema_span=EMA_SPAN):
+    """返回 (每行的 ema / atr / n_high 序列, 推进后的状态)
+
+    state 为 None 时从头计算。各列同时递推，每根新K线的计算量与历史长度无关。
+    """
+    rows, columns = close.shape
+    if state is None:
+        state = init_state(columns)
+    if active is None:
+        active = np.ones((rows, columns), dtype=bool)
+
+    alpha = 2.0 / (ema_span + 1.0)
+    series = {key: np.full((rows, columns), np.nan) for key in ('ema', 'atr', 'n_high')}
+    for i in range(rows):
+        series['ema'][i], series['atr'][i], series['n_high'][i] = _step(
+            state, high[i], low[i], close[i], active[i], alpha)
+
+    return series, state
+
+
+# 批量计算所有标的的指标序列
+def compute_panel_indicators(frames, ema_span=EMA_SPAN, atr_window=ATR_WINDOW,
+                             n_period=N_PERIOD, exit_multiplier=EXIT_ATR_MULTIPLIER):
+    """返回包含 ema / atr / n_high / dynamic_exit / exit_distance_pct 序列的面板"""
+    panel = build_panel(frames)
+    close = panel['Close']
+
+    state = init_state(len(panel['symbols']), atr_window, n_period)
+    series, panel['state'] = advance(state, panel['High'], panel['Low'], close,
+                                     panel['active'], ema_span)
+    panel.update(series)
+    panel['dynamic_exit'] = panel['n_high'] - exit_multiplier * panel['atr']
+    panel['exit_distance_pct'] = (close - panel['dynamic_exit']) / close
+
+    return panel
+
+
+# 组装单个标的的指标结果
+def indicator_values(close, ema, atr, n_high, exit_multiplier=EXIT_ATR_MULTIPLIER):
+    dynamic_exit = n_high - exit_multiplier * atr
+    return {
+        'Close': float(close),
+        'ema61': float(ema),
+        'atr14': float(atr),
+        'n_high': float(n_high),
+        'dynamic_exit': float(dynamic_exit),
+        'exit_distance_pct': float((close - dynamic_exit) / close),
+    }
+
+
+# 取出每个标的最新一根K线的指标值
+def latest_indicators(panel, min_bars=MIN_BARS):
+    """返回 symbol→指标字典，K线不足 min_bars 的标的为 None"""
+    results = {}
+    if not panel['symbols']:
+        return results
+
+    for j, symbol in enumerate(panel['symbols']):
+        if panel['lengths'][j] < min_bars:
+            results[symbol] = None
+            continue
+
+        results[symbol] = indicator_values(panel['Close'][-1, j], panel['ema'][-1, j],
+                                           panel['atr'][-1, j], panel['n_high'][-1, j])
+
+    return results
@@ -0,0 +1,62 @@
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+# 各市场的时区和开收盘时间（午休不单独处理）
+MARKET_SESSIONS = {
+    "US": {"tz": "America/New_York", "open": time(9, 30), "close": time(16, 0)},
+    "CN": {"tz": "Asia/Shanghai", "open": time(9, 30), "close": time(15, 0)},
+    "HK": {"tz": "Asia/Hong_Kong", "open": time(9, 30), "close": time(16, 0)},
+}
+
+# 收盘后数据源发布日线所需的时间
+PUBLISH_DELAY = timedelta(minutes=30)
+
+
+# 标的所属市场，可在 PORTFOLIO 中用 market 字段指定
+def market_of(item):
+    if item.get('market'):
+        return item['market']
+    if item['source'] == 'akshare':
+        return "CN"
+    symbol = item['symbol'].upper()
+    if symbol.endswith('.HK'):
+        return "HK"
+    if symbol.endswith('.SS') or symbol.endswith('.SZ'):
+        return "CN"
+    return "US"
+
+
+# 下一次可能出现新日线的时间（下一个交易日收盘并发布之后）
+def next_bar_time(market, now=None):
+    """返回带时区的时间；节假日按交易日处理，最多多刷新一次"""
+    session = MARKET_SESSIONS[market]
+    tz = ZoneInfo(session["tz"])
+    now = now.astimezone(tz) if now is not None else datetime.now(tz)
+
+    day = now.date()
+    while True:
+        ready = datetime.combine(day, session["close"], tzinfo=tz) + PUBLISH_DELAY
+        if day.weekday() < 5 and ready > now:
+            return ready
+        day += timedelta(days=1)
+
+
+
+def _market_now(market, now=None):
+    tz = ZoneInfo(MARKET_SESSIONS[market]["tz"])
+    return now.astimezone(tz) if now is not None else datetime.now(tz)
+
+
+# 当天交易日的日期：工作日开盘之后（含收盘后）返回当地日期，否则返回 None
+def session_date(market, now=None):
+    now = _market_now(market, now)
+    if now.weekday() >= 5 or now.time() < MARKET_SESSIONS[market]["open"]:
+        return None
+    return now.date()
+
+
+# 市场当前是否在交易时段内
+def is_trading(market, now=None):
+    now = _market_now(market, now)
+    session = MARKET_SESSIONS[market]
+    return now.weekday() < 5 and session["open"] <= now.time() <= session["close"]
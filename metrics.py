@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from bar_store import DATA_DIR
+
+# 每次运行的指标追加写入该文件，一行一次运行，便于对比历次运行的耗时
+METRICS_PATH = os.path.join(DATA_DIR, "metrics.jsonl")
+
+# 文件超过该大小时改名为 metrics.jsonl.1（覆盖更早的记录），重新开始写
+METRICS_MAX_BYTES = 5 * 1024 * 1024
+
+# 倒序读取时每次读取的字节数
+TAIL_BLOCK_SIZE = 64 * 1024
+
+_append_lock = threading.Lock()
+
+
+# 返回数据的行数和内存占用（不统计字符串等对象的实际大小，避免逐个遍历）
+def payload_size(payload):
+    if isinstance(payload, (pd.DataFrame, pd.Series)):
+        return len(payload), int(payload.memory_usage(deep=False).sum())
+    return 0, 0
+
+
+# 单次数据源调用的计时：区分等待限流名额的时间和请求本身的时间
+class CallTimer:
+    def __init__(self):
+        self.created = time.perf_counter()
+        self.request_start = None
+        self.payload = None
+
+    def started(self):
+        """在拿到请求名额、即将发出请求时调用"""
+        self.request_start = time.perf_counter()
+
+
+# 一次运行的各阶段耗时、数据源调用统计和计数器
+class RunMetrics:
+    """线程安全，获取线程和主线程共用同一个实例"""
+
+    def __init__(self):
+        self.stages = {}
+        self.calls = {}
+        self.counters = {}
+        self.symbols = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def add_stage(self, name, seconds):
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_symbol(self, symbol, seconds):
+        with self.lock:
+            self.symbols[symbol] = self.symbols.get(symbol, 0.0) + seconds
+
+    @contextmanager
+    def call(self, endpoint):
+        """记录一次数据源调用：耗时、等待限流的时间、是否出错、返回的数据量"""
+        timer = CallTimer()
+        ok = False
+        try:
+            yield timer
+            ok = True
+        finally:
+            end = time.perf_counter()
+            request_start = timer.request_start or timer.created
+            rows, size = payload_size(timer.payload)
+            with self.lock:
+                entry = self.calls.setdefault(endpoint, {"calls": 0, "failures": 0, "seconds": 0.0,
+                                                         "wait_seconds": 0.0, "rows": 0, "bytes": 0})
+                entry["calls"] += 1
+                entry["failures"] += 0 if ok else 1
+                entry["seconds"] += end - request_start
+                entry["wait_seconds"] += request_start - timer.created
+                entry["rows"] += rows
+                entry["bytes"] += size
+
+    def summary(self):
+        with self.lock:
+            return {
+                "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+                "calls": {endpoint: dict(entry, seconds=round(entry["seconds"], 4),
+                                         wait_seconds=round(entry["wait_seconds"], 4))
+                          for endpoint, entry in self.calls.items()},
+                "counters": dict(self.counters),
+                "symbols": {symbol: round(seconds, 4) for symbol, seconds in self.symbols.items()},
+            }
+
+
+# 追加写入的记录文件超过 max_bytes 时改名为 <path>.1（覆盖更早的记录），由调用方在写入锁内调用
+def rotate_file(path, max_bytes):
+    try:
+        if os.path.getsize(path) >= max_bytes:
+            os.replace(path, path + ".1")
+    except OSError:
+        pass
+
+
+# 追加一条运行记录，文件过大时先轮转
+def append_metrics(kind, summary, **fields):
+    record = dict(fields, kind=kind, time=datetime.now().astimezone().isoformat(timespec='seconds'), **summary)
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+    with _append_lock:
+        rotate_file(METRICS_PATH, METRICS_MAX_BYTES)
+        with open(METRICS_PATH, "a", encoding="utf-8") as f:
+            f.write(line)
+    return record
+
+
+# 从文件末尾开始逐行倒序读取，只读到需要的位置
+def _reversed_lines(path):
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        remainder = b""
+        while position > 0:
+            size = min(TAIL_BLOCK_SIZE, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + remainder).split(b"\n")
+            remainder = lines.pop(0)
+            yield from reversed(lines)
+        yield remainder
+
+
+# 从 JSONL 文件末尾读取最近的记录
+def tail_records(path, limit=None, accept=None, marker=b""):
+    """按时间顺序返回最近 limit 条记录，当前文件不够时接着读轮转前的 <path>.1
+
+    accept(record) 为 False 的记录不计入；不包含 marker 的行不解析。写了一半或损坏的行跳过。
+    """
+    records = []
+    for current in (path, path + ".1"):
+        try:
+            for line in _reversed_lines(current):
+                if not line.strip() or marker not in line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if accept is not None and not accept(record):
+                    continue
+                records.append(record)
+                if limit and len(records) >= limit:
+                    return records[::-1]
+        except OSError:
+            continue
+    return records[::-1]
+
+
+# 读取最近的运行记录，kind 不为 None 时只包含该类记录
+def load_metrics(limit=None, kind=None):
+    if kind is None:
+        return tail_records(METRICS_PATH, limit)
+    # 不是该类的行大多不需要解析JSON
+    return tail_records(METRICS_PATH, limit, accept=lambda record: record.get("kind") == kind,
+                        marker=f'"kind": {json.dumps(kind)}'.encode())
@@ -0,0 +1,506 @@
+import logging
+import threading
+import time
+import traceback
+from datetime import datetime
+
+import pandas as pd
+import yfinance as yf
+import akshare as ak
+
+from bar_block import build_bar_block
+from bar_store import load_bars, last_bar_date, update_bars
+from fetch_engine import FETCH_MAX_WORKERS, provider_slot, run_concurrent
+from indicators import MIN_BARS
+from indicator_state import update_indicators
+from timeframes import calculate_timeframes, timeframe_columns
+from event_detection import detect_events
+from market_calendar import market_of, next_bar_time
+from metrics import RunMetrics, append_metrics
+from spot_quotes import fetch_spot_quotes, splice_live_bars
+from corporate_actions import apply_actions, load_actions, symbol_version
+from watchlist import load_watchlist, watchlist_path
+from akshare_router import (endpoint_allowed, endpoint_order, is_outage_error, is_suppressed,
+                            record_endpoint_failure, record_endpoint_success, resolve_endpoint,
+                            save_routes, suppress_symbol)
+
+logger = logging.getLogger(__name__)
+
+# 标的配置
+PORTFOLIO = [
+    {"category": "美股大盘", "symbol": "^IXIC", "name": "纳斯达克指数", "source": "yfinance"},
+    {"category": "A股大盘", "symbol": "000001", "name": "上证指数", "source": "akshare"},
+    {"category": "美股科技ETF", "symbol": "XLK", "name": "科技ETF", "source": "yfinance"},
+    {"category": "美股医药ETF", "symbol": "XLV", "name": "医疗ETF", "source": "yfinance"},
+    {"category": "A股科技ETF", "symbol": "516630", "name": "云计算50", "source": "akshare"},
+    {"category": "A股科技ETF", "symbol": "588200", "name": "科创芯片", "source": "akshare"},
+    {"category": "A股医药ETF", "symbol": "588860", "name": "科创医药", "source": "akshare"},
+    {"category": "港股医药ETF", "symbol": "159892", "name": "恒生医药", "source": "akshare"},
+    {"category": "港股医药ETF", "symbol": "159316", "name": "恒生创新药", "source": "akshare"},
+    {"category": "港股科技ETF", "symbol": "513180", "name": "恒生科技", "source": "akshare"},
+    {"category": "美股纳指ETF", "symbol": "513300", "name": "纳指ETF", "source": "akshare"},
+    {"category": "黄金ETF", "symbol": "518880", "name": "黄金ETF", "source": "akshare"},
+    {"category": "美股科技个股", "symbol": "NVDA", "name": "英伟达", "source": "yfinance"},
+    {"category": "美股科技个股", "symbol": "TSLA", "name": "特斯拉", "source": "yfinance"},
+    {"category": "港股科技个股", "symbol": "0700.HK", "name": "腾讯控股", "source": "yfinance"},
+    {"category": "A股游戏个股", "symbol": "002425", "name": "ST凯文", "source": "akshare"},
+    {"category": "A股机器人个股", "symbol": "000559", "name": "万向钱潮", "source": "akshare"},
+    {"category": "A股算力个股", "symbol": "600654", "name": "中安科", "source": "akshare"},
+    {"category": "A股医美个股", "symbol": "002004", "name": "华邦健康", "source": "akshare"},
+]
+
+# 当前使用的标的列表：指定了标的文件（--watchlist 或 LEO_WATCHLIST）时从文件读取，否则为 PORTFOLIO
+def load_portfolio(path=None):
+    path = watchlist_path(path)
+    return load_watchlist(path) if path else PORTFOLIO
+
+# 首次全量拉取的起始日期，之后只增量拉取（周线/月线指标需要足够长的历史）
+HISTORY_START_DATE = "20240101"
+
+# 手动调整的除权除息信息（首次运行时写入公司行动表，之后以公司行动表为准）
+DIVIDEND_ADJUSTMENTS = {
+    "002004": {
+        "date": "2025-09-16", 
+        "dividend_per_share": 0.2,  # 每股现金分红0.2元
+        "adjustment_type": "cash_dividend",  # 现金分红
+        "confirmed": True
+    },
+}
+
+# 运行消息：计算过程不直接操作界面，消息由调用方展示（Streamlit页面）或写入结果（批处理）
+class RunLog:
+    def __init__(self):
+        self.entries = []
+        self.lock = threading.Lock()
+        # 本次运行的耗时和调用统计，随消息一起传给各个获取函数
+        self.metrics = RunMetrics()
+
+    def add(self, level, message, symbol=None, detail=None):
+        entry = {"level": level, "symbol": symbol, "message": message, "detail": detail}
+        with self.lock:
+            self.entries.append(entry)
+        logger.log(logging.ERROR if level == "error" else logging.WARNING, message)
+
+    def warning(self, message, symbol=None):
+        self.add("warning", message, symbol)
+
+    def error(self, message, symbol=None, detail=None):
+        self.add("error", message, symbol, detail)
+
+    def drain(self):
+        """取出并清空已记录的消息"""
+        with self.lock:
+            entries, self.entries = self.entries, []
+        return entries
+
+# 获取数据函数 - 使用yfinance (本地缓存 + 增量拉取)
+def get_data_yfinance(symbol, name, log=None):
+    log = log or RunLog()
+    end_date = datetime.now()
+    
+    # 已有本地数据时只拉取最后一根K线之后的数据
+    stored = load_bars('yfinance', symbol)
+    last_date = last_bar_date(stored)
+    fetch_start = last_date if last_date is not None else pd.Timestamp(HISTORY_START_DATE)
+    
+    try:
+        # 下载数据
+        with log.metrics.call('yfinance.download') as call:
+            with provider_slot('yfinance'):
+                call.started()
+                # 不复权：已存储的K线不会随新的除权除息重新调整，复权统一由公司行动表处理
+                data = yf.download(symbol, start=fetch_start, end=end_date, auto_adjust=False, progress=False)
+            call.payload = data
+        
+        bars = update_bars('yfinance', symbol, stored, data)
+        if bars is None or bars.empty:
+            log.warning(f"未获取到 {name}({symbol}) 的数据", symbol)
+            return None
+        
+        return bars
+        
+    except Exception as e:
+        if stored is not None:
+            log.warning(f"获取 {name}({symbol}) 最新数据失败，使用本地缓存: {e}", symbol)
+            return stored
+        log.error(f"获取 {name}({symbol}) 数据失败: {e}", symbol)
+        return None
+
+# 批量获取数据 - 一次 yf.download 请求所有 yfinance 标的
+def get_data_yfinance_batch(items, log=None):
+    """返回 symbol→DataFrame，批量结果中缺失的标的逐个回退到 get_data_yfinance"""
+    log = log or RunLog()
+    if not items:
+        return {}
+    
+    end_date = datetime.now()
+    
+    # 按最早需要的日期统一拉取，已有的K线在合并时会被去重
+    symbols = [item['symbol'] for item in items]
+    stored_bars = {symbol: load_bars('yfinance', symbol) for symbol in symbols}
+    last_dates = [last_bar_date(stored_bars[symbol]) for symbol in symbols]
+    if any(last_date is None for last_date in last_dates):
+        fetch_start = pd.Timestamp(HISTORY_START_DATE)
+    else:
+        fetch_start = min(last_dates)
+    
+    frames = {}
+    try:
+        with log.metrics.call('yfinance.download_batch') as call:
+            with provider_slot('yfinance'):
+                call.started()
+                data = yf.download(symbols, start=fetch_start, end=end_date,
+                                   group_by='column', auto_adjust=False, progress=False)
+            call.payload = data
+    except Exception:
+        data = None
+    
+    if data is not None and not data.empty:
+        for symbol in symbols:
+            # 多个标的时列为 (Price, Ticker) 两层，拆分为单个标的的K线
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(-1):
+                    continue
+                symbol_data = data.xs(symbol, axis=1, level=-1)
+            else:
+                symbol_data = data
+            
+            # 不同市场交易日不同，去掉该标的没有交易的日期
+            symbol_data = symbol_data.dropna(how='all')
+            if symbol_data.empty:
+                continue
+            
+            bars = update_bars('yfinance', symbol, stored_bars[symbol], symbol_data)
+            if bars is not None and not bars.empty:
+                frames[symbol] = bars
+    
+    # 批量请求中失败的标的单独重试
+    for item in items:
+        if item['symbol'] not in frames:
+            log.metrics.count('yfinance_batch_fallbacks')
+            start = time.perf_counter()
+            frames[item['symbol']] = get_data_yfinance(item['symbol'], item['name'], log)
+            log.metrics.record_symbol(item['symbol'], time.perf_counter() - start)
+    
+    return frames
+
+# 获取数据函数 - 使用akshare (按已知接口优先调用，失败的标的和接口短期内跳过)
+def get_data_akshare(symbol, name, max_retries=3, log=None):
+    log = log or RunLog()
+    # 已有本地数据时只拉取最后一根K线之后的数据
+    stored = load_bars('akshare', symbol)
+    last_date = last_bar_date(stored)
+    start_date = last_date.strftime('%Y%m%d') if last_date is not None else HISTORY_START_DATE
+    
+    # 近期获取失败的标的直接跳过
+    if is_suppressed(symbol):
+        log.metrics.count('akshare_suppressed')
+        if stored is None:
+            log.warning(f"{name}({symbol}) 近期获取失败，暂时跳过", symbol)
+        return stored
+    
+    last_error = None
+    for attempt in range(max_retries):
+        had_error = False
+        skipped = False
+        if attempt > 0:
+            log.metrics.count('akshare_retries')
+        
+        for position, endpoint in enumerate(endpoint_order(symbol)):
+            if not endpoint_allowed(endpoint):
+                # 熔断中的接口立即重试也不会放行，本轮不计入重试
+                log.metrics.count('akshare_breaker_skips')
+                skipped = True
+                continue
+            if position > 0:
+                log.metrics.count('akshare_fallbacks')
+            
+            try:
+                with log.metrics.call(f'akshare.{endpoint}') as call:
+                    with provider_slot('akshare'):
+                        call.started()
+                        df = getattr(ak, endpoint)(symbol=symbol, period="daily",
+                                                   start_date=start_date,
+                                                   end_date=datetime.now().strftime('%Y%m%d'))
+                    call.payload = df
+            except Exception as e:
+                last_error = e
+                # 只有网络类错误计入熔断并触发重试
+                if is_outage_error(e):
+                    record_endpoint_failure(endpoint)
+                    had_error = True
+                continue
+            
+            record_endpoint_success(endpoint)
+            if df is None or df.empty:
+                # 增量拉取没有新K线（如休市日）时直接使用本地数据
+                if stored is not None:
+                    return stored
+                continue
+            
+            resolve_endpoint(symbol, endpoint)
+            
+            df = df.rename(columns={
+                '日期': 'Date',
+                '开盘': 'Open',
+                '收盘': 'Close',
+                '最高': 'High',
+                '最低': 'Low',
+                '成交量': 'Volume'
+            })
+            df['Date'] = pd.to_datetime(df['Date'])
+            df.set_index('Date', inplace=True)
+            
+            # 合并进本地存储
+            return update_bars('akshare', symbol, stored, df)
+        
+        # 没有网络类错误时重试也不会有不同结果
+        if not had_error:
+            break
+    
+    # 只有所有接口都实际调用过且都没有数据时才短期跳过该标的，接口熔断不说明标的本身有问题
+    if not skipped:
+        suppress_symbol(symbol)
+    if stored is not None:
+        log.warning(f"获取 {name}({symbol}) 最新数据失败，使用本地缓存: {last_error}", symbol)
+        return stored
+    if last_error is not None:
+        log.error(f"获取 {name}({symbol}) 数据失败: {last_error}", symbol)
+    else:
+        log.warning(f"未获取到 {name}({symbol}) 的数据", symbol)
+    return None
+
+# 处理除权除息调整：按公司行动表的累计复权因子一次性调整，不修改输入
+def adjust_for_dividends(df, symbol):
+    return apply_actions(df, symbol)
+
+# 检测可能的除权除息事件：全部标的的完整历史一次性向量化扫描
+def detect_dividend_events(frames, portfolio, cache=None, log=None):
+    """检测可能的除权除息事件"""
+    log = log or RunLog()
+    key = ("dividend_events", frames_fingerprint(frames))
+    events = cache.get(key) if cache is not None else None
+    if events is not None:
+        return events
+    
+    try:
+        with log.metrics.stage("dividend_detection"):
+            events = detect_events(frames, portfolio)
+    except Exception as e:
+        log.error(f"检测除权除息事件时出错: {e}", detail=traceback.format_exc())
+        return []
+    
+    if cache is not None:
+        cache.put(key, events, earliest_next_bar(portfolio))
+    return events
+
+# 批量计算技术指标：所有标的对齐成二维数组后一次性计算
+def calculate_technicals_panel(frames, cache=None, log=None, portfolio=None):
+    """返回 (symbol→指标结果, 调整后K线的 BarBlock)，K线不足的标的结果为 None
+
+    指标结果不再各自持有K线，图表等按代码从 BarBlock 中取出。
+    """
+    log = log or RunLog()
+    key = ("technicals", frames_fingerprint(frames), load_actions()["version"])
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None:
+        return cached
+    
+    try:
+        # 处理除权除息调整
+        adjusted = {}
+        with log.metrics.stage("adjust"):
+            for symbol, df in frames.items():
+                if df is not None and not df.empty and len(df) >= MIN_BARS:
+                    adjusted[symbol] = adjust_for_dividends(df, symbol)
+        
+        # 指标按K线增量递推，除权调整变化时重建
+        with log.metrics.stage("indicators"):
+            versions = {symbol: symbol_version(symbol) for symbol in adjusted}
+            latest = update_indicators(adjusted, versions)
+        
+        # 周线/月线由调整后的日线合并，不需要额外下载
+        with log.metrics.stage("timeframes"):
+            timeframe_results = calculate_timeframes(adjusted, versions)
+        
+        results = {}
+        for symbol in frames:
+            result = latest.get(symbol)
+            if result is None:
+                results[symbol] = None
+                continue
+            
+            # 判断趋势状态
+            result['trend_status'] = '🟢 多头' if result['Close'] > result['ema61'] else '🔴 空头'
+            result.update(timeframe_columns(timeframe_results[symbol]))
+            results[symbol] = result
+        
+        # 调整后的K线打包成连续数组，供快照、图表共享
+        with log.metrics.stage("bar_block"):
+            bars = build_bar_block({symbol: adjusted[symbol] for symbol in frames if results[symbol] is not None})
+        
+    except Exception as e:
+        log.error(f"计算技术指标时出错: {e}", detail=traceback.format_exc())
+        return {symbol: None for symbol in frames}, build_bar_block({})
+    
+    if cache is not None:
+        cache.put(key, (results, bars), earliest_next_bar(portfolio or load_portfolio()))
+    return results, bars
+
+# 计算单个标的的技术指标
+def calculate_technicals_simple(df, symbol):
+    return calculate_technicals_panel({symbol: df})[0][symbol]
+
+# 生成操作建议
+def generate_action(result, category):
+    if result is None:
+        return '⏳ 数据不足'
+    
+    if '违规' in category:
+        return '🚨 违反宪法'
+    
+    if result.get('trend_status', '') == '🔴 空头':
+        return '🔴 破位清仓'
+    
+    exit_pct = result.get('exit_distance_pct', 0)
+    if exit_pct < 0:
+        return '🎯 触发止盈'
+    
+    return '🟢 持有'
+
+# 汇总仪表板各行：指标结果加上标的信息和操作建议
+def build_dashboard_rows(portfolio, technicals):
+    rows = []
+    for item in portfolio:
+        result = technicals.get(item['symbol'])
+        if result is not None:
+            result['symbol'] = item['symbol']
+            result['name'] = item['name']
+            result['category'] = item['category']
+            result['action'] = generate_action(result, item['category'])
+            rows.append(result)
+    return rows
+
+# 获取单个标的的数据
+def fetch_item(item, log=None):
+    log = log or RunLog()
+    start = time.perf_counter()
+    try:
+        if item['source'] == 'yfinance':
+            return get_data_yfinance(item['symbol'], item['name'], log=log)
+        return get_data_akshare(item['symbol'], item['name'], log=log)
+    finally:
+        log.metrics.record_symbol(item['symbol'], time.perf_counter() - start)
+
+# 获取一组标的的数据：yfinance 标的合并为一个批量任务，其余逐个获取
+def fetch_task(task, log=None):
+    if task['batch']:
+        return get_data_yfinance_batch(task['items'], log=log)
+    item = task['items'][0]
+    return {item['symbol']: fetch_item(item, log)}
+
+# 数据获取阶段：每个标的每次运行只下载一次，按数据源限流并发获取
+def fetch_portfolio(portfolio, progress=None, max_workers=FETCH_MAX_WORKERS, cache=None, log=None, timeout=None):
+    """返回 (symbol→DataFrame, symbol→获取状态)，供后续各阶段共享
+
+    传入 cache 时，所属市场还不可能有新日线的标的直接使用缓存，不再下载。
+    progress(completed, total, message) 在调用方线程中回调；超过 timeout 秒仍未完成的标的记为失败。
+    """
+    log = log or RunLog()
+    frames = {}
+    fetch_status = {}
+    
+    remaining = []
+    for item in portfolio:
+        df = cache.get(("bars", item['source'], item['symbol'])) if cache is not None else None
+        if df is not None:
+            frames[item['symbol']] = df
+            fetch_status[item['symbol']] = {"ok": True, "rows": len(df), "error": None, "cached": True}
+        else:
+            remaining.append(item)
+    
+    yfinance_items = [item for item in remaining if item['source'] == 'yfinance']
+    tasks = [{"batch": True, "items": yfinance_items}] if yfinance_items else []
+    tasks += [{"batch": False, "items": [item]} for item in remaining if item['source'] != 'yfinance']
+    
+    completed = len(portfolio) - len(remaining)
+    for task, task_frames, error in run_concurrent(tasks, lambda task: fetch_task(task, log), max_workers,
+                                                   timeout=timeout):
+        completed += len(task['items'])
+        if progress is not None:
+            names = '、'.join(item['name'] for item in task['items'])
+            progress(completed, len(portfolio), f"已获取 {names} 的数据")
+        
+        for item in task['items']:
+            df = (task_frames or {}).get(item['symbol'])
+            if error is not None:
+                fetch_status[item['symbol']] = {"ok": False, "rows": 0, "error": str(error) or type(error).__name__}
+            elif df is not None and not df.empty:
+                frames[item['symbol']] = df
+                fetch_status[item['symbol']] = {"ok": True, "rows": len(df), "error": None, "cached": False}
+                if cache is not None:
+                    cache.put(("bars", item['source'], item['symbol']), df, next_bar_time(market_of(item)))
+            else:
+                fetch_status[item['symbol']] = {"ok": False, "rows": 0, "error": "无数据"}
+    
+    # 本次新确定的接口和失败的标的一次写回路由表
+    save_routes()
+    return frames, fetch_status
+
+# 当前K线数据的标识，用于判断分析结果是否可以复用
+def frames_fingerprint(frames):
+    return tuple(
+        (symbol, len(df), df.index[-1], float(df['Close'].iloc[-1]))
+        for symbol, df in sorted(frames.items())
+    )
+
+# 缓存结果的过期时间：最早可能出现新日线的市场
+def earliest_next_bar(portfolio):
+    return min(next_bar_time(market) for market in {market_of(item) for item in portfolio})
+
+# 完整计算流程：获取 → 除权检测 → 复权 → 指标 → 操作建议
+def run_pipeline(portfolio=None, cache=None, progress=None, max_workers=FETCH_MAX_WORKERS, timeout=None,
+                 intraday=False):
+    """不依赖Streamlit运行整个计算流程，返回各阶段的结果和运行消息
+
+    intraday 为 True 时历史K线使用缓存，只用全市场实时行情批量更新当天的最后一根K线，
+    指标从倒数第二根K线的检查点增量计算。
+    """
+    portfolio = portfolio or load_portfolio()
+    log = RunLog()
+    
+    # 载入公司行动表（首次运行时写入手动配置的除权除息信息）
+    load_actions(seed=DIVIDEND_ADJUSTMENTS)
+    
+    start = time.perf_counter()
+    with log.metrics.stage("fetch"):
+        frames, fetch_status = fetch_portfolio(portfolio, progress, max_workers, cache, log, timeout)
+    live_symbols = []
+    if intraday:
+        with log.metrics.stage("spot_quotes"):
+            quotes = fetch_spot_quotes(portfolio, log)
+            frames = splice_live_bars(frames, quotes)
+        live_symbols = sorted(symbol for symbol in quotes if symbol in frames)
+        # 盘中结果每次刷新都不同，不放入缓存
+        cache = None
+    dividend_events = detect_dividend_events(frames, portfolio, cache, log)
+    technicals, bars = calculate_technicals_panel(frames, cache, log, portfolio)
+    rows = build_dashboard_rows(portfolio, technicals)
+    
+    # 本次运行的耗时统计追加到指标文件
+    log.metrics.add_stage("total", time.perf_counter() - start)
+    metrics = log.metrics.summary()
+    append_metrics("pipeline", metrics, intraday=intraday, symbols=len(portfolio),
+                   succeeded=sum(1 for status in fetch_status.values() if status['ok']))
+    
+    return {
+        "frames": frames,
+        "fetch_status": fetch_status,
+        "dividend_events": dividend_events,
+        "technicals": technicals,
+        "rows": rows,
+        "bars": bars,
+        "live_symbols": live_symbols,
+        "metrics": metrics,
+        "messages": log.drain(),
+    }
@@ -0,0 +1,94 @@
+"""后台刷新进程：按各市场收盘时间预先获取并计算整个组合，写出供页面读取的快照
+
+页面直接读取最新快照，不再在打开时等待下载；多个页面共享同一份快照。
+    python refresher.py            # 常驻运行
+    python refresher.py --once     # 只刷新一次
+    python refresher.py --intraday-interval 60   # 交易时段内每分钟用全市场实时行情更新当天K线
+    python refresher.py --watchlist watchlist.csv  # 从文件读取标的列表，文件修改后自动重新计算
+"""
+import argparse
+import logging
+import time
+from datetime import datetime
+
+from corporate_actions import load_actions
+from market_calendar import is_trading, market_of
+from pipeline import DIVIDEND_ADJUSTMENTS, load_portfolio
+from result_cache import ResultCache
+from snapshot import load_snapshot, refresh_snapshot, snapshot_expires_at, snapshot_is_stale, snapshot_matches
+
+logger = logging.getLogger("refresher")
+
+# 等待期间检查快照的间隔（秒），页面确认除权除息或手动刷新后能及时发现
+POLL_INTERVAL = 60
+
+
+# 是否有市场处于交易时段
+def any_market_trading(portfolio, now=None):
+    return any(is_trading(market, now) for market in {market_of(item) for item in portfolio})
+
+
+# 盘中快照是否到了更新时间
+def intraday_due(snapshot, portfolio, interval, now=None):
+    now = now or datetime.now().astimezone()
+    if interval <= 0 or not any_market_trading(portfolio, now):
+        return False
+    return (now - datetime.fromisoformat(snapshot['as_of'])).total_seconds() >= interval
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按市场收盘时间定时刷新仪表板快照")
+    parser.add_argument('--once', action='store_true', help="刷新一次后退出")
+    parser.add_argument('--timeout', type=float, default=600, help="每次刷新数据获取的最长时间（秒）")
+    parser.add_argument('--intraday-interval', type=float, default=0,
+                        help="交易时段内更新当天K线的间隔（秒），0 表示只在收盘后刷新")
+    parser.add_argument('--watchlist', help="标的文件（CSV/YAML），默认使用 LEO_WATCHLIST 或内置组合")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    load_actions(seed=DIVIDEND_ADJUSTMENTS)
+
+    # 跨轮次保留已获取的K线，还没有新日线的市场不再重新下载
+    cache = ResultCache()
+    while True:
+        try:
+            portfolio = load_portfolio(args.watchlist)
+        except (OSError, ValueError):
+            logger.exception("读取标的文件失败")
+            if args.once:
+                return 1
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        snapshot = load_snapshot()
+        full = (args.once or snapshot is None or snapshot_is_stale(snapshot)
+                or not snapshot_matches(snapshot, portfolio))
+        if full or intraday_due(snapshot, portfolio, args.intraday_interval):
+            try:
+                snapshot = refresh_snapshot(portfolio, cache, timeout=args.timeout, intraday=not full)
+            except Exception:
+                logger.exception("刷新快照失败")
+                if args.once:
+                    return 1
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            succeeded = sum(1 for status in snapshot['fetch_status'].values() if status['ok'])
+            logger.info("快照 %s: %d/%d 个标的获取成功，%d 个盘中更新，下次刷新 %s", snapshot['version'], succeeded,
+                        len(snapshot['fetch_status']), len(snapshot.get('live_symbols', [])),
+                        snapshot_expires_at(snapshot).strftime('%Y-%m-%d %H:%M %Z'))
+
+        if args.once:
+            return 0
+
+        remaining = (snapshot_expires_at(snapshot) - datetime.now().astimezone()).total_seconds()
+        if args.intraday_interval > 0:
+            remaining = min(remaining, args.intraday_interval)
+        time.sleep(min(POLL_INTERVAL, max(1.0, remaining)))
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except KeyboardInterrupt:
+        pass
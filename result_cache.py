@@ -0,0 +1,35 @@
+import threading
+from datetime import datetime, timezone
+
+
+# 带过期时间的进程内缓存，多个会话和每次重跑共享
+class ResultCache:
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, now=None):
+        """返回未过期的缓存值，没有时返回 None"""
+        now = now or datetime.now(timezone.utc)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self.entries[key]
+                return None
+            return value
+
+    def put(self, key, value, expires_at):
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+
+    def expiry(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
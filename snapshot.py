@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+
+from alerts import evaluate_snapshot
+from bar_block import BarBlock
+from bar_store import DATA_DIR, write_json_atomic
+from corporate_actions import load_actions
+from market_calendar import market_of, next_bar_time
+from pipeline import load_portfolio, run_pipeline
+from timeframes import TIMEFRAME_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshots")
+LATEST_PATH = os.path.join(SNAPSHOT_DIR, "latest.json")
+
+# 保留的快照个数，页面仍在读取的旧快照不会被立即删除
+SNAPSHOT_KEEP = 3
+
+# 有标的获取失败时，快照在该时间后过期以便重试
+SNAPSHOT_RETRY_DELAY = timedelta(minutes=10)
+
+# 仪表板表格的列（与页面上的 df_dashboard 一致，不含调整后的K线）
+DASHBOARD_COLUMNS = ['symbol', 'name', 'category', 'Close', 'ema61', 'trend_status', 'atr14',
+                     'n_high', 'dynamic_exit', 'exit_distance_pct', 'action'] + TIMEFRAME_COLUMNS
+
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+# 已读取的快照：version→快照，同一进程内的所有会话共享
+_loaded = {}
+
+
+def _write_arrow(df, path):
+    _write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+
+
+def _write_table(table, path):
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+# 内存映射读取，数据按需从页缓存载入，不复制整个文件
+def _read_arrow(path):
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+# 写出新快照并切换为最新版本
+def write_snapshot(result, portfolio=None):
+    """快照先完整写入临时目录再改名，最后原子替换 latest.json，读取方总是看到完整的快照"""
+    portfolio = portfolio or load_portfolio()
+    now = datetime.now().astimezone()
+    version = now.strftime('%Y%m%dT%H%M%S%f')
+
+    dashboard = pd.DataFrame(result['rows'], columns=DASHBOARD_COLUMNS)
+    markets = sorted({market_of(item) for item in portfolio})
+    meta = {
+        "version": version,
+        "as_of": now.isoformat(timespec='seconds'),
+        "next_updates": {market: next_bar_time(market, now).isoformat() for market in markets},
+        "actions_version": load_actions()["version"],
+        "live_symbols": result.get('live_symbols', []),
+        "metrics": result.get('metrics', {}),
+        "fetch_status": result['fetch_status'],
+        "dividend_events": result['dividend_events'],
+        "messages": result['messages'],
+    }
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_dir = os.path.join(SNAPSHOT_DIR, f".{version}.{os.getpid()}.tmp")
+    os.makedirs(tmp_dir)
+    _write_arrow(dashboard, os.path.join(tmp_dir, "dashboard.arrow"))
+    _write_table(result['bars'].to_arrow(), os.path.join(tmp_dir, "bars.arrow"))
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp_dir, os.path.join(SNAPSHOT_DIR, version))
+
+    write_json_atomic(LATEST_PATH, {"version": version})
+
+    _prune_snapshots(version)
+    return version
+
+
+# 删除较旧的快照
+def _prune_snapshots(current):
+    versions = sorted(name for name in os.listdir(SNAPSHOT_DIR)
+                      if not name.startswith('.') and os.path.isdir(os.path.join(SNAPSHOT_DIR, name)))
+    for version in versions[:-SNAPSHOT_KEEP]:
+        if version != current:
+            shutil.rmtree(os.path.join(SNAPSHOT_DIR, version), ignore_errors=True)
+
+
+# 最新快照的版本
+def latest_version():
+    try:
+        with open(LATEST_PATH, encoding="utf-8") as f:
+            return json.load(f)["version"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+# 读取快照，没有快照时返回 None
+def load_snapshot(version=None):
+    """返回快照元信息，以及 dashboard（DataFrame）和 bars（BarBlock，数组直接引用内存映射的文件）"""
+    version = version or latest_version()
+    if version is None:
+        return None
+
+    with _lock:
+        if version in _loaded:
+            return _loaded[version]
+
+    path = os.path.join(SNAPSHOT_DIR, version)
+    try:
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            snapshot = json.load(f)
+        snapshot['dashboard'] = _read_arrow(os.path.join(path, "dashboard.arrow")).to_pandas()
+        snapshot['bars'] = BarBlock.from_arrow(_read_arrow(os.path.join(path, "bars.arrow")))
+    except (OSError, ValueError, pa.ArrowInvalid):
+        return None
+
+    # 只保留最新读取的快照，旧快照的内存映射随之释放
+    with _lock:
+        _loaded.clear()
+        _loaded[version] = snapshot
+    return snapshot
+
+
+# 快照中单个标的调整后的K线，没有时返回 None
+def snapshot_bars(snapshot, symbol):
+    return snapshot['bars'].frame(symbol)
+
+
+# 快照中多个标的调整后的K线，返回 symbol→K线
+def snapshot_bars_many(snapshot, symbols):
+    return snapshot['bars'].frames(symbols)
+
+
+# 快照的过期时间：最早可能出现新日线的市场，有获取失败时提前重试
+def snapshot_expires_at(snapshot):
+    expires_at = min(datetime.fromisoformat(when) for when in snapshot['next_updates'].values())
+    if any(not status['ok'] for status in snapshot['fetch_status'].values()):
+        expires_at = min(expires_at, datetime.fromisoformat(snapshot['as_of']) + SNAPSHOT_RETRY_DELAY)
+    return expires_at
+
+
+# 快照是否需要重新计算
+def snapshot_is_stale(snapshot, grace=timedelta(0), now=None):
+    """公司行动表变化后立即失效；grace 让页面在后台刷新进程之后才自行刷新"""
+    if snapshot['actions_version'] != load_actions()["version"]:
+        return True
+    now = now or datetime.now().astimezone()
+    return now >= snapshot_expires_at(snapshot) + grace
+
+
+# 快照是否覆盖了当前标的列表（标的文件修改后需要重新计算）
+def snapshot_matches(snapshot, portfolio):
+    return set(snapshot['fetch_status']) == {item['symbol'] for item in portfolio}
+
+
+# 计算并写出新快照
+def refresh_snapshot(portfolio=None, cache=None, progress=None, timeout=None, intraday=False):
+    """同一进程内多个会话同时请求刷新时只计算一次，等待中的会话直接使用新快照
+
+    每个新快照写出后评估一次操作建议的变化并发出提醒。
+    """
+    requested = latest_version()
+    with _refresh_lock:
+        current = latest_version()
+        if current != requested:
+            snapshot = load_snapshot(current)
+            if snapshot is not None:
+                return snapshot
+
+        portfolio = portfolio or load_portfolio()
+        result = run_pipeline(portfolio, cache, progress, timeout=timeout, intraday=intraday)
+        version = write_snapshot(result, portfolio)
+        snapshot = load_snapshot(version)
+        if snapshot is not None:
+            try:
+                evaluate_snapshot(snapshot)
+            except Exception:
+                logger.exception("评估操作建议提醒失败")
+    return snapshot
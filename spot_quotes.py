@@ -0,0 +1,139 @@
+import logging
+
+import akshare as ak
+import pandas as pd
+import yfinance as yf
+
+from akshare_router import resolved_endpoint
+from bar_store import BAR_COLUMNS, normalize_bars
+from fetch_engine import provider_slot
+from market_calendar import market_of, session_date
+from metrics import RunMetrics
+
+logger = logging.getLogger(__name__)
+
+# akshare 历史接口对应的全市场实时行情接口，以及行情列到K线列的映射
+# 按标的已解析的历史接口选择，保证实时价与历史K线是同一个品种（如上证指数与平安银行同为 000001）
+SPOT_ENDPOINTS = {
+    "fund_etf_hist_em": "fund_etf_spot_em",
+    "stock_zh_a_hist": "stock_zh_a_spot_em",
+    "stock_zh_index_hist": "stock_zh_index_spot_em",
+}
+
+SPOT_ARGS = {"stock_zh_index_spot_em": {"symbol": "沪深重要指数"}}
+
+SPOT_COLUMNS = {
+    "fund_etf_spot_em": {'开盘价': 'Open', '最高价': 'High', '最低价': 'Low', '最新价': 'Close', '成交量': 'Volume'},
+    "stock_zh_a_spot_em": {'今开': 'Open', '最高': 'High', '最低': 'Low', '最新价': 'Close', '成交量': 'Volume'},
+    "stock_zh_index_spot_em": {'今开': 'Open', '最高': 'High', '最低': 'Low', '最新价': 'Close', '成交量': 'Volume'},
+}
+
+# yfinance 取最近几天的日线，最后一根即当天盘中的K线
+YFINANCE_SPOT_PERIOD = "5d"
+
+
+def _metrics(log):
+    return log.metrics if log is not None else RunMetrics()
+
+
+def _warn(log, message, symbol=None):
+    if log is not None:
+        log.warning(message, symbol)
+    else:
+        logger.warning(message)
+
+
+# akshare：每个行情接口一次请求全市场，从中取出组合内的标的
+def _akshare_spot(items, log=None, now=None):
+    groups = {}
+    for item in items:
+        endpoint = resolved_endpoint(item['symbol'])
+        if endpoint in SPOT_ENDPOINTS:
+            groups.setdefault(SPOT_ENDPOINTS[endpoint], []).append(item)
+
+    quotes = {}
+    for spot_endpoint, group in groups.items():
+        try:
+            with _metrics(log).call(f'akshare.{spot_endpoint}') as call:
+                with provider_slot('akshare'):
+                    call.started()
+                    table = getattr(ak, spot_endpoint)(**SPOT_ARGS.get(spot_endpoint, {}))
+                call.payload = table
+        except Exception as e:
+            _warn(log, f"获取实时行情 {spot_endpoint} 失败，盘中价格暂不更新: {e}")
+            continue
+
+        table = table.drop_duplicates('代码').set_index('代码')
+        today = pd.Timestamp(session_date("CN", now))
+        for item in group:
+            if item['symbol'] not in table.index:
+                continue
+            row = table.loc[item['symbol']]
+            bar = {column: row[source] for source, column in SPOT_COLUMNS[spot_endpoint].items()}
+            # 停牌或休市日没有成交，不生成当天的K线
+            if pd.isna(bar['Close']) or not bar['Volume'] > 0:
+                continue
+            date = row['数据日期'] if '数据日期' in row.index and not pd.isna(row['数据日期']) else today
+            quotes[item['symbol']] = normalize_bars(pd.DataFrame([bar], index=[date]))
+
+    return quotes
+
+
+# yfinance：一次 yf.download 请求所有标的最近几天的日线
+def _yfinance_spot(items, log=None):
+    symbols = [item['symbol'] for item in items]
+    try:
+        with _metrics(log).call('yfinance.download_spot') as call:
+            with provider_slot('yfinance'):
+                call.started()
+                data = yf.download(symbols, period=YFINANCE_SPOT_PERIOD, interval="1d",
+                                   group_by='column', auto_adjust=False, progress=False)
+            call.payload = data
+    except Exception as e:
+        _warn(log, f"获取 yfinance 实时行情失败，盘中价格暂不更新: {e}")
+        return {}
+
+    quotes = {}
+    if data is None or data.empty:
+        return quotes
+    for symbol in symbols:
+        if isinstance(data.columns, pd.MultiIndex):
+            if symbol not in data.columns.get_level_values(-1):
+                continue
+            symbol_data = data.xs(symbol, axis=1, level=-1)
+        else:
+            symbol_data = data
+        symbol_data = symbol_data.dropna(subset=['Close'])
+        if not symbol_data.empty:
+            quotes[symbol] = normalize_bars(symbol_data.iloc[-1:])
+    return quotes
+
+
+# 批量获取组合内标的当天的实时K线
+def fetch_spot_quotes(portfolio, log=None, now=None):
+    """返回 symbol→只有一行的K线；只请求当天有交易的市场，每个市场一到两次批量请求"""
+    items = [item for item in portfolio if session_date(market_of(item), now) is not None]
+
+    quotes = {}
+    quotes.update(_akshare_spot([item for item in items if item['source'] == 'akshare'], log, now))
+    yfinance_items = [item for item in items if item['source'] == 'yfinance']
+    if yfinance_items:
+        quotes.update(_yfinance_spot(yfinance_items, log))
+    return quotes
+
+
+# 把实时K线接到历史K线末尾：同一天的K线替换，新的一天追加
+def splice_live_bars(frames, quotes):
+    """返回新的 frames，不修改输入；只替换或追加最后一根K线，其余K线不变"""
+    spliced = dict(frames)
+    for symbol, bar in quotes.items():
+        df = frames.get(symbol)
+        if df is None or df.empty or bar is None or bar.empty:
+            continue
+        date = bar.index[-1]
+        if date < df.index[-1]:
+            continue
+        history = df.iloc[:-1] if date == df.index[-1] else df
+        columns = [col for col in BAR_COLUMNS if col in df.columns]
+        spliced[symbol] = pd.concat([history, bar.reindex(columns=columns)])
+    return spliced
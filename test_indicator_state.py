@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicator_state
+from indicators import ATR_WINDOW, EMA_SPAN, MIN_BARS, N_PERIOD
+from indicator_state import update_indicators
+
+
+# 指标状态写到临时目录
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(indicator_state, "STATE_DIR", str(tmp_path))
+
+
+def make_bars(n, seed, nan_rows=(), flat_rows=(), volatility=0.02):
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0.0005, volatility, n)))
+    # 停牌等收盘价不变的K线
+    for row in flat_rows:
+        close[row] = close[row - 1]
+    spread = np.abs(rng.normal(0, 0.01, n))
+    df = pd.DataFrame({
+        'Open': close,
+        'High': close * (1 + spread),
+        'Low': close * (1 - spread),
+        'Close': close,
+        'Volume': np.ones(n),
+    }, index=pd.bdate_range("2024-01-01", periods=n, name='Date'))
+    df.iloc[list(nan_rows), df.columns.get_indexer(['High', 'Low', 'Close'])] = np.nan
+    return df
+
+
+# pandas 全量计算的最新指标
+def reference(df):
+    prev_close = df['Close'].shift(1)
+    tr = np.fmax(np.fmax(df['High'] - df['Low'], (df['High'] - prev_close).abs()), (df['Low'] - prev_close).abs())
+    return {
+        'ema61': df['Close'].ewm(span=EMA_SPAN, adjust=False).mean().iloc[-1],
+        'atr14': tr.rolling(ATR_WINDOW).mean().iloc[-1],
+        'n_high': df['High'].rolling(N_PERIOD).max().iloc[-1],
+    }
+
+
+def assert_identical(result, df):
+    for key, expected in reference(df).items():
+        if np.isnan(expected):
+            assert np.isnan(result[key]), key
+        else:
+            assert result[key] == expected, key
+
+
+# 逐根喂入K线（每次从上次的检查点继续），并在每根K线之前先喂入一次盘中的临时价格
+def test_incremental_matches_pandas():
+    # A 波动较大、历史较长，ATR 的窗口求和会累积舍入误差
+    frames = {
+        "A": make_bars(400, 1, volatility=0.08),
+        "B": make_bars(120, 2, nan_rows=(80, 81, 100), flat_rows=range(60, 75)),
+        "C": make_bars(40, 3),
+    }
+    for n in range(MIN_BARS, 401):
+        current = {symbol: df.iloc[:n] for symbol, df in frames.items()}
+
+        intraday = {symbol: df.copy() for symbol, df in current.items()}
+        for df in intraday.values():
+            df.iloc[-1, df.columns.get_indexer(['High', 'Close'])] *= 1.03
+        update_indicators(intraday)
+
+        results = update_indicators(current)
+        for symbol, df in current.items():
+            if len(df) < MIN_BARS:
+                assert results[symbol] is None
+            else:
+                assert_identical(results[symbol], df)
+
+
+# 除权版本变化、检查点处的K线被改动或K线增删时从头重建
+def test_rebuild_after_history_change():
+    df = make_bars(120, 4)
+    update_indicators({"A": df.iloc[:100]})
+
+    adjusted = df.copy()
+    adjusted.iloc[:90, adjusted.columns.get_indexer(['High', 'Low', 'Close'])] *= 0.5
+    assert_identical(update_indicators({"A": adjusted}, {"A": "v2"})["A"], adjusted)
+
+    # 检查点在倒数第二根K线
+    adjusted.iloc[-2, adjusted.columns.get_loc('Close')] *= 1.1
+    assert_identical(update_indicators({"A": adjusted}, {"A": "v2"})["A"], adjusted)
+
+    removed = adjusted.drop(adjusted.index[30])
+    assert_identical(update_indicators({"A": removed}, {"A": "v2"})["A"], removed)
@@ -0,0 +1,177 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from indicator_state import update_indicators
+
+# 由日线合并的周期：代码→显示名称
+TIMEFRAMES = {"W": "周线", "M": "月线"}
+
+# 仪表板中各周期的列
+TIMEFRAME_COLUMNS = [f"{name}_{timeframe}" for timeframe in TIMEFRAMES
+                     for name in ('trend', 'ema61', 'dynamic_exit')]
+
+OHLCV_AGG = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+
+DAY_NS = 86_400 * 10**9
+
+_lock = threading.Lock()
+
+# 已合并的K线：(symbol, 周期)→(前缀信息, 合并后的日期, 合并后的各列)
+_resampled = {}
+
+# 上次的指标结果：symbol→(日线标识, {周期: 指标结果})
+_results = {}
+
+
+# 日期（datetime64[ns] 的 int64 表示）所属周期的编号，相邻日线编号相同即属于同一周期
+def period_codes(dates, timeframe):
+    if timeframe == "W":
+        # 1970-01-01 为星期四，周六起算，每周以星期五结束（与 pandas 的 W-FRI 一致）
+        return (dates // DAY_NS - 2) // 7
+    return dates.view('datetime64[ns]').astype('datetime64[M]').view(np.int64)
+
+
+# 按周期合并各列，返回 (每个周期最后一个交易日, 合并后的各列)
+def _resample_arrays(dates, columns, timeframe):
+    """开盘取周期第一根日线、收盘取最后一根，最高/最低忽略缺失值，成交量求和"""
+    codes = period_codes(dates, timeframe)
+    if len(codes) == 0:
+        return dates[:0], {col: values[:0] for col, values in columns.items()}
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:] - 1, len(codes) - 1]
+
+    bars = {}
+    for col, values in columns.items():
+        how = OHLCV_AGG.get(col)
+        if how == 'first':
+            bars[col] = values[starts]
+        elif how == 'max':
+            bars[col] = np.fmax.reduceat(values, starts)
+        elif how == 'min':
+            bars[col] = np.fmin.reduceat(values, starts)
+        elif how == 'sum':
+            bars[col] = np.add.reduceat(np.nan_to_num(values), starts)
+        else:
+            bars[col] = values[ends]
+    return dates[ends], bars
+
+
+def _daily_arrays(df):
+    dates = np.asarray(df.index, dtype='datetime64[ns]').view(np.int64)
+    values = df.to_numpy(dtype='float64')
+    return dates, {col: values[:, i] for i, col in enumerate(df.columns)}
+
+
+def _frame(dates, columns, name='Date'):
+    return pd.DataFrame(columns, index=pd.DatetimeIndex(dates.view('datetime64[ns]'), name=name))
+
+
+# 日线合并成周线/月线，每根K线的日期为该周期内最后一个交易日
+def resample_bars(df, timeframe):
+    dates, bars = _resample_arrays(*_daily_arrays(df), timeframe)
+    return _frame(dates, bars, df.index.name)
+
+
+# 增量合并：最后一个周期之前的日线不变时，只重新合并最后一个周期及之后的日线
+def _update_resampled(symbol, timeframe, df, version):
+    """前缀信息记录最后一个周期之前的日线根数和其中最后一根的日期、收盘价，
+    这些日线或除权版本变化（如新的公司行动）时重新全量合并。
+    """
+    dates, columns = _daily_arrays(df)
+    close = columns['Close']
+    with _lock:
+        cached = _resampled.get((symbol, timeframe))
+
+    result = None
+    if cached is not None:
+        prefix, previous_dates, previous = cached
+        count = prefix["count"]
+        if (prefix["version"] == version and count < len(dates) and list(columns) == list(previous)
+                and (count == 0 or (dates[count - 1] == prefix["date"] and close[count - 1] == prefix["close"]))):
+            tail_dates, tail = _resample_arrays(dates[count:], {col: values[count:] for col, values in columns.items()},
+                                                timeframe)
+            keep = len(previous_dates) - 1
+            result = (np.r_[previous_dates[:keep], tail_dates],
+                      {col: np.r_[previous[col][:keep], tail[col]] for col in columns})
+    if result is None:
+        result = _resample_arrays(dates, columns, timeframe)
+
+    # 最后一个周期（可能尚未结束）第一根日线之前的日线根数
+    codes = period_codes(dates, timeframe)
+    count = int(np.searchsorted(codes, codes[-1]))
+    prefix = {"version": version, "count": count,
+              "date": dates[count - 1] if count else None,
+              "close": close[count - 1] if count else None}
+    with _lock:
+        _resampled[(symbol, timeframe)] = (prefix, *result)
+    return _frame(*result, df.index.name)
+
+
+# 指标状态的键：与日线分开保存
+def timeframe_key(symbol, timeframe):
+    return f"{symbol}@{timeframe}"
+
+
+# 日线的标识：除权版本、根数、首尾日期和最后两根收盘价都不变时，周线/月线的指标也不变
+def _daily_key(df, version):
+    close = df['Close'].to_numpy()
+    return (version, len(df), df.index[0], df.index[-1], float(close[-2]) if len(close) > 1 else None,
+            float(close[-1]))
+
+
+# 计算各标的周线/月线的指标，不产生网络请求
+def calculate_timeframes(adjusted, versions=None):
+    """adjusted 为 symbol→调整后的日线，返回 symbol→{周期: 指标结果}，K线不足的周期为 None
+
+    指标使用与日线相同的参数和增量递推（检查点在倒数第二根周期K线，即上一个已结束的周期），
+    同样要求至少 MIN_BARS 根周期K线，否则生命线（EMA61）仍明显受最早K线的影响；
+    月线在历史不足约五年半时为“数据不足”，仪表板上不显示该列。
+    日线没有变化的标的直接返回上次的结果，只为有变化的标的合并K线和推进指标。
+    """
+    versions = versions or {}
+    results = {}
+    changed = {}
+    for symbol, df in adjusted.items():
+        if df is None or df.empty:
+            results[symbol] = {timeframe: None for timeframe in TIMEFRAMES}
+            continue
+        key = _daily_key(df, versions.get(symbol))
+        with _lock:
+            cached = _results.get(symbol)
+        if cached is not None and cached[0] == key:
+            results[symbol] = cached[1]
+        else:
+            changed[symbol] = key
+            results[symbol] = {}
+
+    for timeframe in TIMEFRAMES:
+        if not changed:
+            break
+        frames = {timeframe_key(symbol, timeframe): _update_resampled(symbol, timeframe, adjusted[symbol],
+                                                                      versions.get(symbol))
+                  for symbol in changed}
+        latest = update_indicators(frames, {timeframe_key(symbol, timeframe): versions.get(symbol)
+                                            for symbol in changed})
+        for symbol in changed:
+            result = latest.get(timeframe_key(symbol, timeframe))
+            if result is not None:
+                result['trend_status'] = '🟢 多头' if result['Close'] > result['ema61'] else '🔴 空头'
+            results[symbol][timeframe] = result
+
+    with _lock:
+        for symbol, key in changed.items():
+            _results[symbol] = (key, results[symbol])
+    return results
+
+
+# 单个标的各周期的指标结果展开成仪表板的列
+def timeframe_columns(results):
+    columns = {}
+    for timeframe in TIMEFRAMES:
+        result = results.get(timeframe)
+        columns[f"trend_{timeframe}"] = result['trend_status'] if result is not None else '⏳ 数据不足'
+        columns[f"ema61_{timeframe}"] = result['ema61'] if result is not None else float('nan')
+        columns[f"dynamic_exit_{timeframe}"] = result['dynamic_exit'] if result is not None else float('nan')
+    return columns
@@ -0,0 +1,105 @@
+"""从文件读取标的列表，代替 pipeline.PORTFOLIO 中写死的组合
+
+支持 CSV 和 YAML，字段与 PORTFOLIO 相同，market（US / CN / HK，不区分大小写）可省略：
+    category,symbol,name,source,market
+    A股科技ETF,516630,云计算50,akshare,
+
+YAML 为条目列表（或 {"portfolio": [...]}），A股代码需加引号，否则 000001 会被解析成数字。
+文件路径由命令行 --watchlist 或环境变量 LEO_WATCHLIST 指定。
+"""
+import os
+import threading
+
+import pandas as pd
+
+from market_calendar import MARKET_SESSIONS
+
+WATCHLIST_ENV = "LEO_WATCHLIST"
+
+REQUIRED_FIELDS = ('category', 'symbol', 'name', 'source')
+OPTIONAL_FIELDS = ('market',)
+SOURCES = ('yfinance', 'akshare')
+
+_lock = threading.Lock()
+
+# 已读取的标的列表：path→(修改时间, 标的列表)
+_loaded = {}
+
+
+# 标的文件路径：参数优先，其次为环境变量，都没有时返回 None
+def watchlist_path(path=None):
+    return path or os.environ.get(WATCHLIST_ENV) or None
+
+
+def _read_csv(path):
+    # 全部按字符串读取，保留代码前面的 0
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, skipinitialspace=True)
+    return df.to_dict('records')
+
+
+def _read_yaml(path):
+    try:
+        import yaml
+    except ImportError:
+        raise ValueError(f"读取 {path} 需要安装 pyyaml") from None
+    with open(path, encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    if isinstance(data, dict):
+        data = data.get('portfolio')
+    if not isinstance(data, list):
+        raise ValueError(f"{path} 应为标的列表")
+    return data
+
+
+# 检查并整理标的条目，字段与 PORTFOLIO 一致
+def _normalize(entries, path):
+    portfolio = []
+    seen = set()
+    for line, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"{path} 第 {line} 项不是标的配置: {entry!r}")
+        if not isinstance(entry.get('symbol', ''), str):
+            raise ValueError(f"{path} 第 {line} 项的代码 {entry['symbol']!r} 不是字符串，YAML 中的代码需加引号")
+        item = {field: str(entry.get(field) or '').strip() for field in REQUIRED_FIELDS + OPTIONAL_FIELDS}
+        if not any(item.values()):
+            continue
+        missing = [field for field in REQUIRED_FIELDS if not item[field]]
+        if missing:
+            raise ValueError(f"{path} 第 {line} 项缺少字段: {', '.join(missing)}")
+        if item['source'] not in SOURCES:
+            raise ValueError(f"{path} 第 {line} 项的数据源 {item['source']!r} 不支持，应为 {' / '.join(SOURCES)}")
+        item['market'] = item['market'].upper()
+        if item['market'] and item['market'] not in MARKET_SESSIONS:
+            raise ValueError(f"{path} 第 {line} 项的市场 {item['market']!r} 不支持，应为 {' / '.join(MARKET_SESSIONS)}")
+        if item['symbol'] in seen:
+            raise ValueError(f"{path} 中的代码 {item['symbol']} 重复")
+        seen.add(item['symbol'])
+        if not item['market']:
+            del item['market']
+        portfolio.append(item)
+    if not portfolio:
+        raise ValueError(f"{path} 中没有标的")
+    return portfolio
+
+
+# 读取标的文件，文件未修改时直接返回上次的结果
+def load_watchlist(path):
+    """返回与 PORTFOLIO 格式相同的标的列表，文件格式错误时抛出 ValueError"""
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        cached = _loaded.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        entries = _read_csv(path)
+    elif ext in ('.yaml', '.yml'):
+        entries = _read_yaml(path)
+    else:
+        raise ValueError(f"不支持的标的文件格式: {path}（应为 .csv / .yaml）")
+    portfolio = _normalize(entries, path)
+
+    with _lock:
+        _loaded[path] = (mtime, portfolio)
+    return portfolio